@@ -4,14 +4,23 @@ Railway Deployment Ready
 """
 
 import os
+import time
+import shutil
 import tempfile
 import json
-from flask import Flask, render_template, request, send_file, jsonify, session
+from flask import Flask, Response, render_template, request, jsonify, session
 from werkzeug.utils import secure_filename
-from dd1750_ocr import extract_items_with_ocr, generate_review_report, ExtractedItem
-from dd1750_core import generate_dd1750_from_verified_items, detect_bom_format
+from dd1750_ocr import generate_review_report, ExtractedItem, ocr_backend_name, OCR_BACKEND
+from dd1750_core import (generate_dd1750_bytes, detect_bom_format,
+                         render_preview, page_slices, ROWS_PER_PAGE)
+from dd1750_extract import extract_items, OCR_DPI
+from dd1750_store import get_session_store
+from dd1750_jobs import get_job_manager, FINISHED_STATUSES
+from dd1750_batch import process_batch_bytes, BATCH_CONCURRENCY
+from dd1750_admission import get_admission_controller, estimate_extraction_mb, QueueFull
+from dd1750_items import new_item_document, next_version, apply_patch, PatchError, VersionConflict
+from dd1750_metrics import get_metrics
 from dataclasses import asdict
-import base64
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production-railway')
@@ -19,20 +28,169 @@ app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 
 ALLOWED_EXTENSIONS = {'pdf'}
 
+# tesserocr is optional; say so at startup when OCR will use the slower CLI
+if OCR_BACKEND == 'auto' and ocr_backend_name() != 'tesserocr':
+    print("OCR backend: tesserocr not installed, falling back to pytesseract (tesseract CLI per page)")
+
+# Seconds between job state reads when streaming progress events
+JOB_POLL_INTERVAL = 0.5
+
+# Seconds a synchronous /upload waits for memory before giving up (gunicorn timeout is 120)
+UPLOAD_ADMISSION_WAIT = 60
+
+# Seconds clients are asked to wait after a queue-full rejection
+RETRY_AFTER = 30
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def current_session_id(create=False):
+    """
+    Return the server-side session ID held in the cookie.
+    
+    The cookie only carries this ID; templates and items live in the
+    session store (see dd1750_store).
+    """
+    sid = session.get('sid')
+    if not get_session_store().valid_id(sid):
+        sid = None
+    if sid is None and create:
+        sid = get_session_store().new_id()
+        session['sid'] = sid
+    return sid
+
+
 @app.route('/')
 def index():
     """Home page"""
-    return render_template('index.html')
+    return render_template('index.html', rows_per_page=ROWS_PER_PAGE)
 
 
 @app.route('/health')
 def health():
     """Health check endpoint for Railway"""
-    return jsonify({'status': 'healthy', 'service': 'dd1750-generator'}), 200
+    return jsonify({'status': 'healthy', 'service': 'dd1750-generator',
+                    'admission': get_admission_controller().status()}), 200
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for all gunicorn workers on this host"""
+    return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4')
+
+
+def check_upload_files():
+    """
+    Validate the BOM and template in the current request.
+    
+    Returns:
+        (bom_file, template_file, None) on success, or
+        (None, None, error_response) if the request should be rejected
+    """
+    if 'bom_file' not in request.files or 'template_file' not in request.files:
+        print("ERROR: Missing files in request")
+        return None, None, (jsonify({'error': 'Missing required files'}), 400)
+    
+    bom_file = request.files['bom_file']
+    template_file = request.files['template_file']
+    
+    print(f"BOM file: {bom_file.filename}")
+    print(f"Template file: {template_file.filename}")
+    
+    if bom_file.filename == '' or template_file.filename == '':
+        print("ERROR: Empty filename")
+        return None, None, (jsonify({'error': 'No files selected'}), 400)
+    
+    if not (allowed_file(bom_file.filename) and allowed_file(template_file.filename)):
+        print("ERROR: Invalid file type")
+        return None, None, (jsonify({'error': 'Only PDF files allowed'}), 400)
+    
+    return bom_file, template_file, None
+
+
+def read_extraction_options():
+    """Read page range, OCR concurrency and preprocessing profile from the upload form."""
+    start_page = int(request.form.get('start_page', 0))
+    end_page = request.form.get('end_page')
+    end_page = int(end_page) if end_page else None
+    print(f"Start page: {start_page}, end page: {end_page}")
+    
+    # Per-request OCR concurrency (capped by OCR_MAX_WORKERS)
+    ocr_workers = request.form.get('ocr_workers')
+    ocr_workers = int(ocr_workers) if ocr_workers else None
+    
+    # Preprocessing profile ('auto', 'fast', 'balanced', 'handwritten')
+    ocr_profile = request.form.get('ocr_profile') or None
+    
+    # Merge repeated NSN/description rows; unset = DD1750_CONSOLIDATE
+    consolidate = request.form.get('consolidate')
+    consolidate = consolidate in ('1', 'on', 'true') if consolidate else None
+    
+    return {'start_page': start_page, 'end_page': end_page,
+            'workers': ocr_workers, 'profile': ocr_profile, 'consolidate': consolidate}
+
+
+def estimate_cost(bom_path, options):
+    """Memory (MB) an extraction of this BOM is expected to need at peak."""
+    return estimate_extraction_mb(bom_path, OCR_DPI, options['workers'], detect_bom_format(bom_path))
+
+
+def busy_response(message):
+    """503 telling the client the server is at capacity and when to retry."""
+    return jsonify({'error': message, 'busy': True}), 503, {'Retry-After': str(RETRY_AFTER)}
+
+
+def run_extraction(sid, bom_path, options, progress=None):
+    """
+    Detect format, extract items and store them for the session.
+    
+    Shared by the synchronous /upload route and background jobs.
+    
+    Returns:
+        The preview payload sent back to the browser
+    """
+    # Detect format
+    print("Detecting BOM format...")
+    bom_format = detect_bom_format(bom_path)
+    print(f"Detected BOM format: {bom_format}")
+    
+    # Extract items (text layer where available, OCR otherwise)
+    print("Starting extraction...")
+    items = extract_items(bom_path, options['start_page'], options['end_page'],
+                          workers=options['workers'], bom_format=bom_format,
+                          profile=options['profile'], consolidate=options['consolidate'],
+                          progress=progress)
+    print(f"Extracted {len(items)} items")
+    
+    # Store items server-side; a new extraction supersedes any list being reviewed
+    items_doc = get_session_store().update_json(
+        sid, 'items',
+        lambda old: new_item_document([asdict(item) for item in items],
+                                      version=next_version(old)))
+    items_list = items_doc['items']
+    print(f"Items stored in session store: {len(items_list)}")
+    
+    # Generate review report
+    report = generate_review_report(items)
+    
+    return {
+        'success': True,
+        'format': bom_format,
+        'total_items': len(items),
+        'items': items_list,
+        'version': items_doc['version'],
+        'report': report,
+        'needs_review': all(item.needs_review for item in items)
+    }
+
+
+def extraction_job(sid, job_dir, bom_path, options, progress=None):
+    """Background job body: run_extraction, then remove the job's BOM copy."""
+    try:
+        return run_extraction(sid, bom_path, options, progress=progress)
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
 
 
 @app.route('/upload', methods=['POST'])
@@ -41,78 +199,43 @@ def upload():
     try:
         print("=== UPLOAD REQUEST RECEIVED ===")
         
-        # Check files
-        if 'bom_file' not in request.files or 'template_file' not in request.files:
-            print("ERROR: Missing files in request")
-            return jsonify({'error': 'Missing required files'}), 400
+        bom_file, template_file, error = check_upload_files()
+        if error:
+            return error
         
-        bom_file = request.files['bom_file']
-        template_file = request.files['template_file']
+        # Store template server-side for later use
+        sid = current_session_id(create=True)
+        get_session_store().put_blob(sid, 'template', template_file.read())
+        print("Template stored in session store")
         
-        print(f"BOM file: {bom_file.filename}")
-        print(f"Template file: {template_file.filename}")
+        options = read_extraction_options()
         
-        if bom_file.filename == '' or template_file.filename == '':
-            print("ERROR: Empty filename")
-            return jsonify({'error': 'No files selected'}), 400
-        
-        if not (allowed_file(bom_file.filename) and allowed_file(template_file.filename)):
-            print("ERROR: Invalid file type")
-            return jsonify({'error': 'Only PDF files allowed'}), 400
-        
-        # Save files temporarily
+        # Save BOM temporarily
         with tempfile.TemporaryDirectory() as tmpdir:
             bom_path = os.path.join(tmpdir, secure_filename(bom_file.filename))
-            template_path = os.path.join(tmpdir, secure_filename(template_file.filename))
-            
             bom_file.save(bom_path)
-            template_file.save(template_path)
+            print(f"BOM saved to: {tmpdir}")
             
-            print(f"Files saved to: {tmpdir}")
+            # Wait for memory like background jobs do, but only briefly
+            admission = get_admission_controller()
+            ticket = get_session_store().new_id()
+            try:
+                admission.enqueue(ticket, estimate_cost(bom_path, options))
+            except QueueFull as e:
+                return busy_response(str(e))
             
-            # Store template in session for later use
-            with open(template_path, 'rb') as f:
-                template_b64 = base64.b64encode(f.read()).decode('utf-8')
-                session['template_b64'] = template_b64
+            try:
+                if not admission.wait(ticket, timeout=UPLOAD_ADMISSION_WAIT):
+                    return busy_response('Server is busy with other BOMs; please try again shortly')
+                response_data = run_extraction(sid, bom_path, options)
+            finally:
+                admission.release(ticket)
             
-            print("Template stored in session")
-            
-            # Get start page
-            start_page = int(request.form.get('start_page', 0))
-            print(f"Start page: {start_page}")
-            
-            # Detect format
-            print("Detecting BOM format...")
-            bom_format = detect_bom_format(bom_path)
-            print(f"Detected BOM format: {bom_format}")
-            
-            # Extract items using OCR
-            print("Starting OCR extraction...")
-            items = extract_items_with_ocr(bom_path, start_page)
-            print(f"Extracted {len(items)} items")
-            
-            # Store items in session
-            items_list = [asdict(item) for item in items]
-            session['items'] = items_list
-            print(f"Items stored in session: {len(items_list)}")
-            
-            # Generate review report
-            report = generate_review_report(items)
-            
-            # Return items for preview
-            response_data = {
-                'success': True,
-                'format': bom_format,
-                'total_items': len(items),
-                'items': items_list,
-                'report': report,
-                'needs_review': all(item.needs_review for item in items)
-            }
-            
-            print(f"Returning response with {len(items_list)} items")
+            print(f"Returning response with {response_data['total_items']} items")
             return jsonify(response_data)
     
     except Exception as e:
+        get_metrics().inc('dd1750_errors_total', where='upload')
         print(f"=== ERROR during upload ===")
         print(f"Error: {e}")
         import traceback
@@ -120,49 +243,330 @@ def upload():
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Start extraction in the background and return a job ID immediately"""
+    try:
+        print("=== JOB SUBMISSION RECEIVED ===")
+        
+        bom_file, template_file, error = check_upload_files()
+        if error:
+            return error
+        
+        store = get_session_store()
+        sid = current_session_id(create=True)
+        store.put_blob(sid, 'template', template_file.read())
+        
+        options = read_extraction_options()
+        
+        # The job outlives this request, so it owns its own temp directory
+        job_dir = tempfile.mkdtemp(prefix='dd1750-job-')
+        bom_path = os.path.join(job_dir, secure_filename(bom_file.filename))
+        bom_file.save(bom_path)
+        
+        try:
+            job_id = get_job_manager(store).submit(sid, extraction_job, sid, job_dir, bom_path, options,
+                                                   cost_mb=estimate_cost(bom_path, options))
+        except QueueFull as e:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return busy_response(str(e))
+        print(f"Submitted job {job_id}")
+        
+        job = get_job_manager(store).get(job_id, owner=sid)
+        return jsonify({
+            'job_id': job_id,
+            'queue_position': job['queue_position'] if job else None,
+            'status_url': f'/jobs/{job_id}',
+            'events_url': f'/jobs/{job_id}/events',
+        }), 202
+    
+    except Exception as e:
+        print(f"Error submitting job: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+def batch_job(sid, job_dir, boms, template_bytes, options, batch_key, progress=None):
+    """Background job body for /batch: build the ZIP and keep it in the session store."""
+    try:
+        zip_bytes, summary = process_batch_bytes(boms, template_bytes, workers=options['workers'],
+                                                 profile=options['profile'],
+                                                 consolidate=options['consolidate'], progress=progress)
+        get_session_store().put_blob(sid, batch_key, zip_bytes)
+        summary['success'] = True
+        summary['download_url'] = f'/batch/{batch_key}'
+        return summary
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+
+@app.route('/batch', methods=['POST'])
+def submit_batch():
+    """Start a batch of BOMs against one template; progress events count BOMs"""
+    try:
+        print("=== BATCH SUBMISSION RECEIVED ===")
+        
+        bom_files = [f for f in request.files.getlist('bom_files') if f.filename]
+        template_file = request.files.get('template_file')
+        
+        if not bom_files or template_file is None or template_file.filename == '':
+            return jsonify({'error': 'Missing required files'}), 400
+        
+        if not all(allowed_file(f.filename) for f in bom_files + [template_file]):
+            return jsonify({'error': 'Only PDF files allowed'}), 400
+        
+        store = get_session_store()
+        sid = current_session_id(create=True)
+        options = read_extraction_options()
+        
+        job_dir = tempfile.mkdtemp(prefix='dd1750-batch-')
+        boms = []
+        for index, bom_file in enumerate(bom_files):
+            # Prefix keeps same-named uploads apart
+            bom_path = os.path.join(job_dir, f"{index:03d}_{secure_filename(bom_file.filename)}")
+            bom_file.save(bom_path)
+            boms.append((bom_file.filename, bom_path))
+        
+        # BOMs run BATCH_CONCURRENCY at a time, so charge for the largest that many
+        costs = sorted((estimate_cost(path, options) for _, path in boms), reverse=True)
+        
+        batch_key = store.new_id()
+        try:
+            job_id = get_job_manager(store).submit(sid, batch_job, sid, job_dir, boms,
+                                                   template_file.read(), options, batch_key,
+                                                   cost_mb=sum(costs[:BATCH_CONCURRENCY]))
+        except QueueFull as e:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return busy_response(str(e))
+        print(f"Submitted batch job {job_id} with {len(boms)} BOM(s)")
+        
+        return jsonify({
+            'job_id': job_id,
+            'total_boms': len(boms),
+            'status_url': f'/jobs/{job_id}',
+            'events_url': f'/jobs/{job_id}/events',
+        }), 202
+    
+    except Exception as e:
+        print(f"Error submitting batch: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+@app.route('/batch/<batch_key>')
+def download_batch(batch_key):
+    """Download a finished batch's ZIP of DD1750s and review report"""
+    store = get_session_store()
+    sid = current_session_id()
+    zip_bytes = store.get_blob(sid, batch_key) if sid and store.valid_id(batch_key) else None
+    if zip_bytes is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    
+    return Response(
+        zip_bytes,
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': 'attachment; filename=DD1750_batch.zip',
+            'Content-Length': str(len(zip_bytes)),
+        },
+    )
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Poll a job's status; includes the preview payload once done"""
+    sid = current_session_id()
+    job = get_job_manager(get_session_store()).get(job_id, owner=sid) if sid else None
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    job.pop('owner', None)
+    return jsonify(job)
+
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream a job's progress events as Server-Sent Events"""
+    manager = get_job_manager(get_session_store())
+    owner = current_session_id()
+    if owner is None or manager.get(job_id, owner=owner) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def stream():
+        sent = 0
+        while True:
+            job = manager.get(job_id, owner=owner)
+            if job is None:
+                yield 'event: error\ndata: {"error": "Job not found"}\n\n'
+                return
+            
+            for event in job['events'][sent:]:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            sent = len(job['events'])
+            
+            if job['status'] in FINISHED_STATUSES:
+                return
+            time.sleep(JOB_POLL_INTERVAL)
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/items', methods=['GET'])
+def get_items():
+    """Current item list and its version"""
+    sid = current_session_id()
+    items_doc = get_session_store().get_json(sid, 'items') if sid else None
+    if items_doc is None:
+        return jsonify({'error': 'No items found. Please upload a BOM first.'}), 404
+    
+    return jsonify({'version': items_doc['version'], 'items': items_doc['items']})
+
+
+@app.route('/items', methods=['PATCH'])
+def patch_items():
+    """
+    Apply edit/insert/delete/move operations by item ID (see dd1750_items).
+    
+    The body carries the version the client last saw; if someone else has
+    changed the list since, nothing is applied and 409 returns the current
+    version so the client can reload.
+    """
+    try:
+        sid = current_session_id()
+        if sid is None:
+            return jsonify({'error': 'Session expired. Please upload files again.'}), 400
+        
+        body = request.get_json(silent=True) or {}
+        if not isinstance(body.get('version'), int):
+            return jsonify({'error': 'Missing list version'}), 400
+        
+        result = {}
+        
+        def update(items_doc):
+            if items_doc is None:
+                raise PatchError('No items found. Please upload a BOM first.')
+            new_doc, result['inserted'], result['items'] = apply_patch(items_doc, body.get('ops'), body['version'])
+            return new_doc
+        
+        items_doc = get_session_store().update_json(sid, 'items', update)
+        
+        return jsonify({'success': True, 'version': items_doc['version'],
+                        'inserted': result['inserted'], 'items': result['items']})
+    
+    except VersionConflict as e:
+        return jsonify({'error': str(e), 'version': e.current_version}), 409
+    except PatchError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error patching items: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/update_items', methods=['POST'])
 def update_items():
-    """Update items with user corrections"""
+    """Replace the whole item list with user corrections (see PATCH /items for single edits)"""
     try:
+        sid = current_session_id()
+        if sid is None:
+            return jsonify({'error': 'Session expired. Please upload files again.'}), 400
+        
         updated_items = request.json.get('items', [])
-        session['items'] = updated_items
+        items_doc = get_session_store().update_json(
+            sid, 'items',
+            lambda old: new_item_document(updated_items, version=next_version(old)))
         
-        return jsonify({'success': True, 'message': 'Items updated successfully'})
+        return jsonify({'success': True, 'message': 'Items updated successfully',
+                        'version': items_doc['version']})
     
     except Exception as e:
         print(f"Error updating items: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+def items_from_dicts(items_data):
+    """Convert stored item dicts back to ExtractedItem objects"""
+    items = []
+    for item_dict in items_data:
+        item = ExtractedItem(
+            line_no=item_dict['line_no'],
+            description=item_dict['description'],
+            nsn=item_dict['nsn'],
+            qty=item_dict['qty'],
+            description_confidence=item_dict.get('description_confidence', 100.0),
+            nsn_confidence=item_dict.get('nsn_confidence', 100.0),
+            qty_confidence=item_dict.get('qty_confidence', 100.0),
+            needs_review=item_dict.get('needs_review', False),
+            review_notes=item_dict.get('review_notes', []),
+            source_page=item_dict.get('source_page', 0),
+            source_pages=item_dict.get('source_pages', [])
+        )
+        items.append(item)
+    return items
+
+
+@app.route('/preview/<int:page>')
+def preview(page):
+    """Render one DD1750 page (1-based) from the current items; ?format=png (default) or pdf"""
+    fmt = request.args.get('format', 'png')
+    if fmt not in ('png', 'pdf'):
+        return jsonify({'error': 'format must be png or pdf'}), 400
+    
+    try:
+        store = get_session_store()
+        sid = current_session_id()
+        items_doc = store.get_json(sid, 'items') if sid else None
+        template_bytes = store.get_blob(sid, 'template') if sid else None
+        
+        if not items_doc or not items_doc['items']:
+            return jsonify({'error': 'No items found. Please upload a BOM first.'}), 400
+        
+        if not template_bytes:
+            return jsonify({'error': 'Template not found. Please upload files again.'}), 400
+        
+        # Unverified items are previewed too; verification gates /generate only
+        items = items_from_dicts(items_doc['items'])
+        try:
+            data = render_preview(items, template_bytes, page - 1, fmt)
+        except IndexError as e:
+            return jsonify({'error': str(e)}), 404
+        
+        headers = {
+            'X-Total-Pages': str(len(page_slices(items))),
+            'X-Items-Version': str(items_doc['version']),
+            'Cache-Control': 'no-cache',
+        }
+        if fmt == 'pdf':
+            headers['Content-Disposition'] = f'inline; filename=DD1750_page_{page}.pdf'
+        return Response(data, mimetype='application/pdf' if fmt == 'pdf' else 'image/png', headers=headers)
+    
+    except Exception as e:
+        get_metrics().inc('dd1750_errors_total', where='preview_route')
+        print(f"Error rendering preview: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/generate', methods=['POST'])
 def generate():
     """Generate DD1750 from verified items"""
     try:
-        # Get verified items from session
-        items_data = session.get('items', [])
-        template_b64 = session.get('template_b64')
+        # Get verified items from the session store
+        store = get_session_store()
+        sid = current_session_id()
+        items_doc = store.get_json(sid, 'items') if sid else None
+        items_data = items_doc['items'] if items_doc else None
+        template_bytes = store.get_blob(sid, 'template') if sid else None
         
         if not items_data:
             return jsonify({'error': 'No items found. Please upload a BOM first.'}), 400
         
-        if not template_b64:
+        if not template_bytes:
             return jsonify({'error': 'Template not found. Please upload files again.'}), 400
         
         # Convert back to ExtractedItem objects
-        items = []
-        for item_dict in items_data:
-            item = ExtractedItem(
-                line_no=item_dict['line_no'],
-                description=item_dict['description'],
-                nsn=item_dict['nsn'],
-                qty=item_dict['qty'],
-                description_confidence=item_dict.get('description_confidence', 100.0),
-                nsn_confidence=item_dict.get('nsn_confidence', 100.0),
-                qty_confidence=item_dict.get('qty_confidence', 100.0),
-                needs_review=item_dict.get('needs_review', False),
-                review_notes=item_dict.get('review_notes', [])
-            )
-            items.append(item)
+        items = items_from_dicts(items_data)
         
         # Check if any items still need review
         if any(item.needs_review for item in items):
@@ -171,21 +575,24 @@ def generate():
                 'error': f'{needs_review_count} items still need review. Please verify all items before generating DD1750.'
             }), 400
         
-        # Generate DD1750
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Restore template from base64
-            template_path = os.path.join(tmpdir, 'template.pdf')
-            with open(template_path, 'wb') as f:
-                f.write(base64.b64decode(template_b64))
-            
-            output_path = os.path.join(tmpdir, 'DD1750_generated.pdf')
-            
-            # Generate the DD1750
-            generate_dd1750_from_verified_items(items, template_path, output_path)
-            
-            return send_file(output_path, as_attachment=True, download_name='DD1750.pdf')
+        # Generate DD1750 in memory; generation falls back to the blank
+        # template (or nothing at all) on failure, which is not a DD1750
+        pdf_bytes, count = generate_dd1750_bytes(items, template_bytes)
+        if not pdf_bytes or count == 0:
+            get_metrics().inc('dd1750_errors_total', where='generate_route')
+            return jsonify({'error': 'DD1750 generation failed. Check that the template is a valid PDF.'}), 500
+        
+        return Response(
+            pdf_bytes,
+            mimetype='application/pdf',
+            headers={
+                'Content-Disposition': 'attachment; filename=DD1750.pdf',
+                'Content-Length': str(len(pdf_bytes)),
+            },
+        )
     
     except Exception as e:
+        get_metrics().inc('dd1750_errors_total', where='generate_route')
         print(f"Error generating DD1750: {e}")
         import traceback
         traceback.print_exc()
@@ -0,0 +1,223 @@
+"""
+Admission Control for DD1750 Extraction
+Memory-aware scheduling so concurrent uploads queue instead of exhausting the container
+"""
+
+import os
+import json
+import time
+import fcntl
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Callable, Iterator
+
+from pypdf import PdfReader
+
+from dd1750_ocr import OCR_WORKERS, OCR_MAX_WORKERS
+
+
+# Host-wide memory (MB) that admitted extractions may use at once
+MEMORY_BUDGET_MB = int(os.environ.get('DD1750_MEMORY_BUDGET_MB', 2048))
+
+# Extractions allowed to wait for memory; beyond this new work is rejected
+QUEUE_MAX = int(os.environ.get('DD1750_QUEUE_MAX', 16))
+
+# Shared by all gunicorn workers on the host
+ADMISSION_PATH = os.environ.get('DD1750_ADMISSION_PATH',
+                                os.path.join(tempfile.gettempdir(), 'dd1750-admission.json'))
+
+# Seconds between admission checks while waiting
+ADMISSION_POLL_INTERVAL = 0.5
+
+# Memory model. A page being OCR'd holds its grayscale render plus the
+# preprocessing copies and tesseract's working set, about this many bytes
+# per pixel; every extraction also carries the parsed PDF and interpreter
+# overhead.
+BYTES_PER_OCR_PIXEL = 6
+BASE_JOB_MB = 64
+PDF_SIZE_FACTOR = 3  # Parsed-document overhead per MB of PDF
+TEXT_PAGE_MB = 0.5
+
+
+class QueueFull(Exception):
+    """Raised when no more extractions can wait for memory."""
+
+
+def estimate_extraction_mb(pdf_path: str, dpi: int = 300, workers: Optional[int] = None,
+                           bom_format: Optional[str] = None) -> float:
+    """
+    Estimate an extraction's peak memory from its page count, page size and DPI.
+
+    Pages are rasterized one at a time per OCR worker (see ocr_pages), so
+    OCR cost scales with pages in flight rather than the page count. A
+    text-layer BOM is charged per page parsed plus one in-flight OCR page
+    for any page that falls back.
+    """
+    if workers is None:
+        workers = OCR_WORKERS
+    workers = max(1, min(workers, OCR_MAX_WORKERS))
+
+    reader = PdfReader(pdf_path)
+    pages = len(reader.pages)
+    if pages:
+        box = reader.pages[0].mediabox
+        width_in, height_in = float(box.width) / 72, float(box.height) / 72
+    else:
+        width_in, height_in = 8.5, 11.0
+
+    page_mb = width_in * dpi * height_in * dpi * BYTES_PER_OCR_PIXEL / (1024 * 1024)
+    file_mb = os.path.getsize(pdf_path) / (1024 * 1024)
+
+    if bom_format == 'TEXT_BASED':
+        ocr_in_flight = 1
+    else:
+        ocr_in_flight = min(workers, max(pages, 1))
+
+    return BASE_JOB_MB + file_mb * PDF_SIZE_FACTOR + pages * TEXT_PAGE_MB + ocr_in_flight * page_mb
+
+
+class AdmissionController:
+    """
+    Admits work against a memory budget shared by every process on the host.
+
+    The ledger is a small JSON file of tickets, updated under an exclusive
+    flock. A ticket is queued at submission (so queue positions are known
+    even before a job thread picks it up) and admitted once its thread is
+    waiting, it is the oldest waiting ticket, and its cost fits in what
+    running tickets leave of the budget. A ticket larger than the whole
+    budget runs alone. Tickets of processes that died are dropped.
+    """
+
+    def __init__(self, path: str = ADMISSION_PATH, budget_mb: float = MEMORY_BUDGET_MB,
+                 queue_max: int = QUEUE_MAX):
+        self.path = path
+        self.budget_mb = budget_mb
+        self.queue_max = queue_max
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @contextmanager
+    def _ledger(self) -> Iterator[Dict[str, Dict]]:
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.path) as f:
+                    tickets = json.load(f)
+            except (FileNotFoundError, ValueError):
+                tickets = {}
+
+            for ticket, entry in list(tickets.items()):
+                try:
+                    os.kill(entry['pid'], 0)
+                except ProcessLookupError:
+                    del tickets[ticket]
+                except PermissionError:
+                    pass
+
+            yield tickets
+
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(tickets, f)
+            os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _queued(tickets: Dict[str, Dict]):
+        return sorted((t for t in tickets.items() if t[1]['state'] != 'running'),
+                      key=lambda t: t[1]['enqueued'])
+
+    def enqueue(self, ticket: str, cost_mb: float) -> int:
+        """
+        Queue a ticket and return its 1-based position.
+
+        Raises:
+            QueueFull: QUEUE_MAX tickets are already waiting
+        """
+        with self._ledger() as tickets:
+            if len(self._queued(tickets)) >= self.queue_max:
+                raise QueueFull(f"{self.queue_max} extractions are already waiting; try again shortly")
+            tickets[ticket] = {
+                'cost': cost_mb,
+                'state': 'queued',
+                'pid': os.getpid(),
+                'enqueued': time.time(),
+            }
+            return len(self._queued(tickets))
+
+    def position(self, ticket: str) -> Optional[int]:
+        """1-based queue position, 0 once admitted, None if unknown."""
+        with self._ledger() as tickets:
+            if ticket not in tickets:
+                return None
+            if tickets[ticket]['state'] == 'running':
+                return 0
+            return [t for t, _ in self._queued(tickets)].index(ticket) + 1
+
+    def try_admit(self, ticket: str) -> Optional[int]:
+        """Admit the ticket if it is next and fits; returns 0 if admitted, else its position."""
+        with self._ledger() as tickets:
+            entry = tickets.get(ticket)
+            if entry is None:
+                raise KeyError(f"Unknown admission ticket {ticket}")
+            if entry['state'] == 'running':
+                return 0
+            entry['state'] = 'waiting'
+
+            queued = self._queued(tickets)
+            waiting = [t for t, e in queued if e['state'] == 'waiting']
+            running_mb = sum(e['cost'] for e in tickets.values() if e['state'] == 'running')
+
+            if waiting[0] == ticket and (running_mb == 0 or running_mb + entry['cost'] <= self.budget_mb):
+                entry['state'] = 'running'
+                return 0
+            return [t for t, _ in queued].index(ticket) + 1
+
+    def wait(self, ticket: str, on_position: Optional[Callable[[int], None]] = None,
+             timeout: Optional[float] = None) -> bool:
+        """
+        Block until the ticket is admitted. on_position is called whenever
+        the queue position changes. Returns False if `timeout` seconds pass
+        first, in which case the ticket is released.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        last_position = None
+
+        while True:
+            position = self.try_admit(ticket)
+            if position == 0:
+                return True
+            if position != last_position and on_position is not None:
+                on_position(position)
+            last_position = position
+            if deadline is not None and time.time() >= deadline:
+                self.release(ticket)
+                return False
+            time.sleep(ADMISSION_POLL_INTERVAL)
+
+    def release(self, ticket: str):
+        with self._ledger() as tickets:
+            tickets.pop(ticket, None)
+
+    def status(self) -> Dict:
+        with self._ledger() as tickets:
+            running = [e for e in tickets.values() if e['state'] == 'running']
+            return {
+                'budget_mb': self.budget_mb,
+                'running': len(running),
+                'running_mb': round(sum(e['cost'] for e in running)),
+                'queued': len(self._queued(tickets)),
+                'queue_max': self.queue_max,
+            }
+
+
+_admission: Optional[AdmissionController] = None
+_admission_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Return the process-wide controller, creating it on first use."""
+    global _admission
+    with _admission_lock:
+        if _admission is None:
+            _admission = AdmissionController()
+    return _admission
@@ -0,0 +1,190 @@
+"""
+Batch Processing for DD1750 Generator
+Many BOMs and one template in, a ZIP of DD1750 packets plus one review report out
+"""
+
+import os
+import io
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, Callable, Sequence, Union, BinaryIO
+
+from dd1750_core import generate_dd1750_bytes, detect_bom_format
+from dd1750_extract import extract_items
+from dd1750_ocr import ExtractedItem, generate_review_report
+from dd1750_metrics import get_metrics
+
+
+# BOMs extracted at once; their OCR pages share the one process pool
+BATCH_CONCURRENCY = int(os.environ.get('DD1750_BATCH_CONCURRENCY', 2))
+
+REPORT_NAME = 'review_report.txt'
+
+
+@dataclass
+class BatchResult:
+    name: str
+    packet: str  # File name of this BOM's DD1750 inside the ZIP
+    items: List[ExtractedItem] = field(default_factory=list)
+    pdf: Optional[bytes] = None
+    error: Optional[str] = None
+
+    @property
+    def needs_review(self) -> int:
+        return sum(1 for item in self.items if item.needs_review)
+
+
+def packet_names(bom_names: Sequence[str]) -> List[str]:
+    """'a.pdf', 'b.pdf', 'a.pdf' -> 'a_DD1750.pdf', 'b_DD1750.pdf', 'a_2_DD1750.pdf'"""
+    names = []
+    seen = {}
+    for bom_name in bom_names:
+        stem = os.path.splitext(os.path.basename(bom_name))[0] or 'bom'
+        seen[stem] = seen.get(stem, 0) + 1
+        suffix = f"_{seen[stem]}" if seen[stem] > 1 else ''
+        names.append(f"{stem}{suffix}_DD1750.pdf")
+    return names
+
+
+def process_bom(name: str, packet: str, bom_path: str, template: Optional[Union[str, bytes]],
+                workers: Optional[int] = None, profile: Optional[str] = None,
+                dpi: Optional[int] = None, consolidate: Optional[bool] = None) -> BatchResult:
+    """Extract one BOM and render its DD1750 (if given a template); errors are recorded, not raised."""
+    result = BatchResult(name, packet)
+    try:
+        bom_format = detect_bom_format(bom_path)
+        result.items = extract_items(bom_path, workers=workers, bom_format=bom_format,
+                                     profile=profile, dpi=dpi, consolidate=consolidate)
+        if not result.items:
+            result.error = 'No items extracted'
+        elif template is not None:
+            result.pdf, _ = generate_dd1750_bytes(result.items, template)
+    except Exception as e:
+        print(f"Error processing {name}: {e}")
+        import traceback
+        traceback.print_exc()
+        result.error = str(e)
+        get_metrics().inc('dd1750_errors_total', where='batch')
+    return result
+
+
+def combined_report(results: List[BatchResult]) -> str:
+    """One report for the batch: a summary table, then each BOM's review report."""
+    report = []
+    report.append("="*80)
+    report.append("DD1750 BATCH REVIEW REPORT")
+    report.append("="*80)
+    report.append(f"\nBOMs: {len(results)}")
+    report.append(f"Total Items Extracted: {sum(len(r.items) for r in results)}")
+    report.append(f"Items Needing Review: {sum(r.needs_review for r in results)}")
+    report.append(f"Failed BOMs: {sum(1 for r in results if r.error)}\n")
+
+    for result in results:
+        status = f"FAILED ({result.error})" if result.error else f"{len(result.items)} items, {result.needs_review} need review"
+        report.append(f"  {result.name} -> {result.packet if result.pdf else '-'}: {status}")
+
+    for result in results:
+        if not result.items:
+            continue
+        report.append(f"\n\n{'#'*80}")
+        report.append(f"# {result.name}  ({result.packet})")
+        report.append(f"{'#'*80}\n")
+        report.append(generate_review_report(result.items))
+
+    return "\n".join(report)
+
+
+def process_batch(boms: Sequence[Tuple[str, str]], template: Union[str, bytes],
+                  output: Union[str, BinaryIO],
+                  workers: Optional[int] = None,
+                  profile: Optional[str] = None,
+                  dpi: Optional[int] = None,
+                  concurrency: int = BATCH_CONCURRENCY,
+                  consolidate: Optional[bool] = None,
+                  progress: Optional[Callable[[int, int, int], None]] = None) -> Dict:
+    """
+    Extract and generate a DD1750 for every BOM and write them to one ZIP.
+
+    BOMs run `concurrency` at a time on threads. Each one's OCR pages go to
+    the shared OCR process pool, the template is parsed once (see
+    load_template) and per-page extraction results are cached, so the
+    batch is one pipeline rather than N separate uploads. Packets are
+    generated whether or not items still need review; the combined report
+    (REPORT_NAME in the ZIP) lists what to check.
+
+    Args:
+        boms: (display name, path) per BOM, in output order
+        template: DD1750 template path or bytes
+        output: ZIP path or writable binary file
+        workers: Pages OCR'd concurrently per BOM
+        profile: OCR preprocessing profile
+        dpi: OCR rasterization resolution
+        concurrency: BOMs processed at once
+        consolidate: Merge repeated NSN/description rows within each BOM
+        progress: Called as progress(bom_index, boms_done, total_boms)
+
+    Returns:
+        Summary with per-BOM item counts, review counts and errors
+    """
+    if isinstance(template, str):
+        with open(template, 'rb') as f:
+            template = f.read()
+
+    names = packet_names([name for name, _ in boms])
+    results: List[Optional[BatchResult]] = [None] * len(boms)
+    metrics = get_metrics()
+    started = time.perf_counter()
+
+    print(f"\n{'='*80}")
+    print(f"BATCH: {len(boms)} BOM(s), {concurrency} at a time")
+    print(f"{'='*80}")
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='dd1750-batch') as executor:
+        futures = {
+            executor.submit(process_bom, name, packet, path, template, workers, profile, dpi,
+                            consolidate): index
+            for index, ((name, path), packet) in enumerate(zip(boms, names))
+        }
+        done = 0
+        for future in futures:
+            index = futures[future]
+            results[index] = future.result()
+            done += 1
+            if progress is not None:
+                progress(index + 1, done, len(boms))
+
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for result in results:
+            if result.pdf is not None:
+                # PDFs are already compressed
+                archive.writestr(result.packet, result.pdf, compress_type=zipfile.ZIP_STORED)
+        archive.writestr(REPORT_NAME, combined_report(results))
+
+    summary = {
+        'total_boms': len(results),
+        'total_items': sum(len(r.items) for r in results),
+        'needs_review': sum(r.needs_review for r in results),
+        'boms': [
+            {'name': r.name, 'packet': r.packet if r.pdf else None,
+             'items': len(r.items), 'needs_review': r.needs_review, 'error': r.error}
+            for r in results
+        ],
+    }
+
+    metrics.observe('dd1750_request_seconds', time.perf_counter() - started, operation='batch')
+
+    print(f"\nBATCH COMPLETE: {summary['total_items']} items from {len(results)} BOM(s), "
+          f"{summary['needs_review']} need review\n")
+
+    return summary
+
+
+def process_batch_bytes(boms: Sequence[Tuple[str, str]], template: Union[str, bytes],
+                        **kwargs) -> Tuple[bytes, Dict]:
+    """process_batch into memory; returns (zip_bytes, summary)."""
+    buffer = io.BytesIO()
+    summary = process_batch(boms, template, buffer, **kwargs)
+    return buffer.getvalue(), summary
+
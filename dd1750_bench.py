@@ -0,0 +1,410 @@
+"""
+Benchmark Harness for DD1750 Extraction
+Synthetic component listings with known items; reports stage times, throughput, memory and accuracy
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+import reportlab
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+
+FIELDS = ('nsn', 'description', 'qty')
+
+NOMENCLATURE = [
+    'WRENCH,ADJUSTABLE', 'BATTERY,NONRECHARGEABLE', 'CABLE ASSEMBLY,SPECIAL PURPOSE',
+    'ANTENNA,WHIP', 'HANDSET,TELEPHONE', 'BAG,TOOL', 'PLIERS,SLIP JOINT', 'SCREWDRIVER,FLAT TIP',
+    'FLASHLIGHT', 'HAMMER,HAND', 'TAPE,PRESSURE SENSITIVE', 'CASE,CARRYING', 'GLOVES,WORK',
+    'LIGHT,MARKER,DISTRESS', 'COVER,PROTECTIVE', 'MOUNT,VEHICULAR', 'TOOL KIT,GENERAL MECHANICS',
+    'SHOVEL,HAND', 'AXE,SINGLE BIT', 'PICK,RAILROAD',
+    # Model numbers and measurements, which mix digits into the description
+    'CABLE ASSY 10 FT', 'SPEAKER LS-671/U', 'BATTERY BA5590 LITHIUM', 'ANTENNA AS-3900/VRC',
+    'RADIO SET AN/PRC-152', 'HOSE ASSEMBLY 3/4 IN',
+]
+
+UNITS = ['EA', 'EA', 'EA', 'PR', 'KT', 'SE']
+
+# Layout in points on a letter page, shared by the text and scanned variants
+COLUMNS = {'lv': 40, 'nsn': 62, 'description': 140, 'ui': 430, 'qty': 480}
+HEADER_Y = 745
+FIRST_ROW_Y = 720
+ROW_PITCH = 20
+FONT_SIZE = 9
+
+# Rasterization resolution of the scanned variant
+SCAN_DPI = 200
+
+# Seconds between memory samples of a case's process tree
+RSS_SAMPLE_INTERVAL = 0.1
+
+
+def make_items(count: int, rng: random.Random) -> List[Dict]:
+    """Ground-truth items with unique NIINs."""
+    niins = set()
+    items = []
+    while len(items) < count:
+        niin = f"{rng.randint(0, 99):02d}{rng.randint(0, 9999999):07d}"
+        if niin in niins:
+            continue
+        niins.add(niin)
+        items.append({
+            'nsn': niin,
+            'description': rng.choice(NOMENCLATURE),
+            'ui': rng.choice(UNITS),
+            'qty': rng.randint(1, 25),
+        })
+    return items
+
+
+def page_lines(page_items: List[Dict]) -> List[Tuple[float, float, str]]:
+    """(x, y, text) in points, y from the bottom as reportlab draws it."""
+    lines = [(40, 770, 'COMPONENT LISTING / HAND RECEIPT')]
+    for name, label in (('lv', 'LV'), ('nsn', 'Material'), ('description', 'Description'),
+                        ('ui', 'UI'), ('qty', 'Auth Qty')):
+        lines.append((COLUMNS[name], HEADER_Y, label))
+
+    y = FIRST_ROW_Y
+    for item in page_items:
+        lines.append((COLUMNS['lv'], y, 'B'))
+        for name in ('nsn', 'description', 'ui', 'qty'):
+            lines.append((COLUMNS[name], y, str(item[name])))
+        y -= ROW_PITCH
+    return lines
+
+
+def scan_image(lines: List[Tuple[float, float, str]], noise: float, rng: np.random.Generator) -> Image.Image:
+    """Draw a page as a grayscale scan at SCAN_DPI with Gaussian noise and a slight blur."""
+    scale = SCAN_DPI / 72
+    width, height = int(letter[0] * scale), int(letter[1] * scale)
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+
+    font_path = os.path.join(os.path.dirname(reportlab.__file__), 'fonts', 'Vera.ttf')
+    font = ImageFont.truetype(font_path, int(FONT_SIZE * scale))
+    for x, y, text in lines:
+        draw.text((x * scale, (letter[1] - y - FONT_SIZE) * scale), text, fill=0, font=font)
+
+    # Table rulings, as on real listings
+    top = (letter[1] - HEADER_Y - FONT_SIZE - 4) * scale
+    draw.line([(30 * scale, top), (560 * scale, top)], fill=0, width=2)
+
+    pixels = np.asarray(image.filter(ImageFilter.GaussianBlur(0.7)), dtype=np.float32)
+    if noise > 0:
+        pixels = pixels + rng.normal(0, noise, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def make_bom(path: str, pages: int, items_per_page: int, seed: int = 0,
+             scanned: bool = False, noise: float = 8.0) -> List[Dict]:
+    """
+    Write a synthetic component listing BOM and return its ground truth.
+
+    The text variant has a real text layer. The scanned variant draws the
+    same layout into an image (no text layer), adds noise and embeds it
+    as a full-page image, so it exercises the OCR path.
+    """
+    rng = random.Random(seed)
+    noise_rng = np.random.default_rng(seed)
+    items = make_items(pages * items_per_page, rng)
+
+    can = canvas.Canvas(path, pagesize=letter)
+    for page in range(pages):
+        page_items = items[page * items_per_page:(page + 1) * items_per_page]
+        for item in page_items:
+            item['page'] = page + 1
+        lines = page_lines(page_items)
+
+        if scanned:
+            image = scan_image(lines, noise, noise_rng)
+            can.drawImage(ImageReader(image), 0, 0, width=letter[0], height=letter[1])
+        else:
+            can.setFont('Helvetica', FONT_SIZE)
+            for x, y, text in lines:
+                can.drawString(x, y, text)
+        can.showPage()
+    can.save()
+
+    return items
+
+
+def make_template(path: str):
+    """A blank letter page; generation overlays onto whatever the template holds."""
+    can = canvas.Canvas(path, pagesize=letter)
+    can.showPage()
+    can.save()
+
+
+def normalize(field: str, value) -> str:
+    if field == 'description':
+        return ' '.join(str(value).upper().replace(',', ' ').split())
+    return str(value).lstrip('0') if field == 'nsn' else str(value)
+
+
+def score(extracted: List[Dict], truth: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """
+    Field-level precision and recall.
+
+    Each extracted item is paired with the unmatched truth item on the
+    same page that agrees on the most fields. A field counts as correct
+    when it equals the paired truth value; 'item' requires all three.
+    """
+    unmatched = list(range(len(truth)))
+    correct = Counter()
+
+    for item in extracted:
+        best, best_agree = None, 0
+        for index in unmatched:
+            if truth[index]['page'] != item['page']:
+                continue
+            agree = [f for f in FIELDS if normalize(f, item[f]) == normalize(f, truth[index][f])]
+            if len(agree) > best_agree:
+                best, best_agree = index, len(agree)
+        if best is None:
+            continue
+        unmatched.remove(best)
+        for f in FIELDS:
+            if normalize(f, item[f]) == normalize(f, truth[best][f]):
+                correct[f] += 1
+        if best_agree == len(FIELDS):
+            correct['item'] += 1
+
+    return {
+        f: {
+            'precision': correct[f] / len(extracted) if extracted else 0.0,
+            'recall': correct[f] / len(truth) if truth else 0.0,
+        }
+        for f in FIELDS + ('item',)
+    }
+
+
+def process_tree_rss(root: int) -> Tuple[float, float]:
+    """
+    Current RSS in MB of a process and of all its live descendants (OCR
+    pool workers, tesseract processes they start), read from /proc.
+    Zeros where /proc is not available.
+    """
+    parents = {}
+    rss = {}
+    try:
+        pids = [int(entry) for entry in os.listdir('/proc') if entry.isdigit()]
+    except OSError:
+        return 0.0, 0.0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('PPid:'):
+                        parents[pid] = int(line.split()[1])
+                    elif line.startswith('VmRSS:'):
+                        rss[pid] = int(line.split()[1]) / 1024  # kB
+        except (OSError, ValueError):
+            continue  # Exited while we looked
+
+    children = {}
+    for pid, parent in parents.items():
+        children.setdefault(parent, []).append(pid)
+    descendants = []
+    frontier = list(children.get(root, []))
+    while frontier:
+        pid = frontier.pop()
+        descendants.append(pid)
+        frontier.extend(children.get(pid, []))
+    return rss.get(root, 0.0), sum(rss.get(pid, 0.0) for pid in descendants)
+
+
+class RssSampler:
+    """
+    Samples process_tree_rss of this process in a background thread.
+
+    RUSAGE_CHILDREN only covers children that have exited and been waited
+    for, so it misses OCR pool workers that are still alive (or were
+    started by an earlier case) and their own children.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak_descendants_mb = 0.0
+        self.peak_total_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        own, descendants = process_tree_rss(os.getpid())
+        self.peak_descendants_mb = max(self.peak_descendants_mb, descendants)
+        self.peak_total_mb = max(self.peak_total_mb, own + descendants)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._sample()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def run_case(case: Dict) -> Dict:
+    """
+    Detect, extract and generate one BOM; runs in a fresh process so peak
+    RSS and warm-up are per case. The extraction cache is never used.
+    """
+    from dd1750_core import detect_bom_format, generate_dd1750_bytes
+    from dd1750_extract import extract_items
+
+    result = {'name': case['name'], 'pages': case['pages'], 'stages': {}}
+    stages = result['stages']
+    devnull = open(os.devnull, 'w')
+    stdout, stderr = sys.stdout, sys.stderr
+    if not case.get('verbose'):
+        sys.stdout = sys.stderr = devnull
+
+    sampler = RssSampler()
+    sampler.start()
+    try:
+        started = time.perf_counter()
+        bom_format = detect_bom_format(case['bom'])
+        stages['detect'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        extract_timings = {}
+        items = extract_items(case['bom'], workers=case.get('workers'), bom_format=bom_format,
+                              use_cache=False, profile=case.get('profile'), dpi=case.get('dpi'),
+                              timings=extract_timings)
+        stages['extract'] = time.perf_counter() - started
+        if not items:
+            # extract_items logs and swallows failures (e.g. no tesseract/poppler)
+            raise RuntimeError("no items extracted; rerun with --verbose for the extraction log")
+
+        started = time.perf_counter()
+        pdf_bytes, _ = generate_dd1750_bytes(items, case['template'])
+        stages['generate'] = time.perf_counter() - started
+
+        result['format'] = bom_format
+        result['extract_stages'] = extract_timings
+        result['items'] = len(items)
+        result['pdf_bytes'] = len(pdf_bytes)
+        result['pages_per_sec'] = case['pages'] / stages['extract'] if stages['extract'] else 0.0
+        with open(case['truth']) as f:
+            truth = json.load(f)
+        result['accuracy'] = score(
+            [{'nsn': i.nsn, 'description': i.description, 'qty': i.qty, 'page': i.source_page} for i in items],
+            truth)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        sampler.stop()
+        sys.stdout, sys.stderr = stdout, stderr
+        devnull.close()
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is KiB on Linux
+    result['peak_rss_mb'] = usage.ru_maxrss / 1024
+    # Sampled every RSS_SAMPLE_INTERVAL, so brief spikes can be missed
+    result['peak_workers_rss_mb'] = sampler.peak_descendants_mb
+    result['peak_total_rss_mb'] = max(sampler.peak_total_mb, result['peak_rss_mb'])
+    return result
+
+
+def build_corpus(directory: str, page_counts: List[int], items_per_page: int,
+                 variants: List[str], noise: float, seed: int) -> List[Dict]:
+    """Write every (variant, page count) BOM plus its truth JSON; returns the cases."""
+    template = os.path.join(directory, 'template.pdf')
+    make_template(template)
+
+    cases = []
+    for variant in variants:
+        for pages in page_counts:
+            name = f"{variant}-{pages}p"
+            bom = os.path.join(directory, f"{name}.pdf")
+            truth = make_bom(bom, pages, items_per_page, seed=seed + pages,
+                             scanned=(variant == 'scanned'), noise=noise)
+            truth_path = os.path.join(directory, f"{name}.truth.json")
+            with open(truth_path, 'w') as f:
+                json.dump(truth, f, indent=2)
+            cases.append({'name': name, 'pages': pages, 'bom': bom, 'truth': truth_path, 'template': template})
+    return cases
+
+
+def print_results(results: List[Dict]):
+    header = (f"{'case':<14}{'items':>6}{'detect':>8}{'extract':>9}{'generate':>9}{'pages/s':>9}"
+              f"{'RSS MB':>8}  {'nsn P/R':>11}  {'desc P/R':>11}  {'qty P/R':>11}  {'item P/R':>11}")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        if 'error' in r:
+            print(f"{r['name']:<14}  ERROR: {r['error']}")
+            continue
+        stages = r['stages']
+        acc = r['accuracy']
+        pr = '  '.join(f"{acc[f]['precision']:>5.2f}/{acc[f]['recall']:<5.2f}" for f in FIELDS + ('item',))
+        print(f"{r['name']:<14}{r['items']:>6}{stages['detect']:>8.3f}{stages['extract']:>9.3f}"
+              f"{stages['generate']:>9.3f}{r['pages_per_sec']:>9.2f}"
+              f"{r['peak_total_rss_mb']:>8.0f}  {pr}")
+        if r['extract_stages']:
+            print(f"{'':<14}  " + ', '.join(f"{stage} {seconds:.3f}s" for stage, seconds in r['extract_stages'].items()))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark DD1750 extraction on a synthetic BOM corpus.")
+    parser.add_argument('--pages', default='1,5,20', help="Comma-separated page counts per BOM")
+    parser.add_argument('--items-per-page', type=int, default=15)
+    parser.add_argument('--variants', default='text,scanned', help="Comma-separated: text, scanned")
+    parser.add_argument('--noise', type=float, default=8.0, help="Gaussian noise sigma for scanned pages")
+    parser.add_argument('--seed', type=int, default=1750)
+    parser.add_argument('--workers', type=int, default=None, help="Pages OCR'd concurrently")
+    parser.add_argument('--profile', default=None, help="OCR preprocessing profile")
+    parser.add_argument('--dpi', type=int, default=None, help="OCR rasterization resolution")
+    parser.add_argument('--corpus-dir', default=None, help="Keep the generated corpus here")
+    parser.add_argument('--json', dest='json_path', default=None, help="Also write results as JSON")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show extraction logs")
+    args = parser.parse_args(argv)
+
+    page_counts = [int(p) for p in args.pages.split(',') if p]
+    variants = [v for v in args.variants.split(',') if v]
+    unknown = set(variants) - {'text', 'scanned'}
+    if unknown:
+        parser.error(f"unknown variant(s): {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix='dd1750-bench-') as tmpdir:
+        directory = args.corpus_dir or tmpdir
+        os.makedirs(directory, exist_ok=True)
+        cases = build_corpus(directory, page_counts, args.items_per_page, variants, args.noise, args.seed)
+
+        results = []
+        spawn = multiprocessing.get_context('spawn')
+        for case in cases:
+            case.update(workers=args.workers, profile=args.profile, dpi=args.dpi, verbose=args.verbose)
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                results.append(executor.submit(run_case, case).result())
+
+    print_results(results)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+    return 1 if any('error' in r for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+On-disk Cache for DD1750 Extraction
+Content-addressed, size-bounded LRU that several gunicorn workers can share.
+Holds per-page extraction results and rendered DD1750 output pages.
+"""
+
+import os
+import json
+import fcntl
+import hashlib
+import tempfile
+from typing import List, Dict, Optional, Any
+
+
+CACHE_ENABLED = os.environ.get('DD1750_CACHE', '1') != '0'
+CACHE_DIR = os.environ.get('DD1750_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'dd1750-cache'))
+CACHE_MAX_MB = int(os.environ.get('DD1750_CACHE_MAX_MB', 512))
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash a file's contents without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Byte-value cache stored as one file per key.
+
+    Writes go to a temp file and are renamed into place, so readers in
+    other processes never see partial entries. Reads bump the file's
+    mtime, which is what eviction orders by (least recently used first).
+    Eviction holds an exclusive lock file so only one process prunes at
+    a time; entries removed under a reader simply become misses.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._written_since_evict = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put_bytes(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        # Scanning the directory is O(entries), so only prune after
+        # roughly 5% of the budget has been written by this process
+        self._written_since_evict += len(data)
+        if self._written_since_evict > self.max_bytes // 20:
+            self.evict()
+
+    def get_json(self, key: str) -> Optional[Any]:
+        data = self.get_bytes(key)
+        if data is None:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError:
+            return None
+
+    def put_json(self, key: str, value: Any):
+        self.put_bytes(key, json.dumps(value).encode('utf-8'))
+
+    def evict(self):
+        """Delete least recently used entries until under 90% of max_bytes."""
+        self._written_since_evict = 0
+        lock_path = os.path.join(self.directory, '.lock')
+
+        with open(lock_path, 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # Another process is already pruning
+
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name == '.lock' or name.endswith('.tmp'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+                    total += st.st_size
+
+            target = int(self.max_bytes * 0.9)
+            if total <= self.max_bytes:
+                return
+
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+
+class ExtractionCache:
+    """
+    Per-page extraction results keyed by BOM content hash.
+
+    Entries hold the parsed rows for one page plus where they came from
+    ('TEXT' or 'OCR'). Line numbers are assigned after merging, so a page
+    entry is valid for any start_page/end_page range that includes it.
+    The config string carries the pipeline version and anything else
+    (DPI, detected format) that changes what a page extracts to.
+    """
+
+    def __init__(self, disk: DiskCache):
+        self.disk = disk
+
+    @staticmethod
+    def page_key(bom_hash: str, page_num: int, config: str) -> str:
+        return f"extract|{config}|{bom_hash}|{page_num}"
+
+    def get_page(self, bom_hash: str, page_num: int, config: str) -> Optional[Dict]:
+        """Return {'source': ..., 'rows': [...]} or None on a miss."""
+        return self.disk.get_json(self.page_key(bom_hash, page_num, config))
+
+    def put_page(self, bom_hash: str, page_num: int, config: str, source: str, rows: List[Dict]):
+        self.disk.put_json(self.page_key(bom_hash, page_num, config),
+                           {'source': source, 'rows': rows})
+
+
+class PageCache:
+    """
+    Item overlays of rendered DD1750 output pages, each a one-page PDF
+    without the template (merged on at assembly), and PNG previews of the
+    finished pages.
+
+    Keyed by the template's content hash and a hash of the items drawn on
+    the page (see dd1750_core.page_slice_hash), so an edit invalidates
+    only the page it lands on. The layout version is part of the key and
+    changes whenever what a page draws changes.
+    """
+
+    def __init__(self, disk: DiskCache):
+        self.disk = disk
+
+    @staticmethod
+    def page_key(template_hash: str, slice_hash: str, layout: str) -> str:
+        return f"page|{layout}|{template_hash}|{slice_hash}"
+
+    def get_page(self, template_hash: str, slice_hash: str, layout: str) -> Optional[bytes]:
+        return self.disk.get_bytes(self.page_key(template_hash, slice_hash, layout))
+
+    def put_page(self, template_hash: str, slice_hash: str, layout: str, pdf: bytes):
+        self.disk.put_bytes(self.page_key(template_hash, slice_hash, layout), pdf)
+
+
+_disk_cache: Optional[DiskCache] = None
+
+
+def configure_extraction_cache(directory: Optional[str] = None, max_mb: Optional[int] = None,
+                               enabled: Optional[bool] = None):
+    """Override the environment settings; takes effect on the next get_*_cache()."""
+    global CACHE_DIR, CACHE_MAX_MB, CACHE_ENABLED, _disk_cache
+    if directory is not None:
+        CACHE_DIR = directory
+    if max_mb is not None:
+        CACHE_MAX_MB = max_mb
+    if enabled is not None:
+        CACHE_ENABLED = enabled
+    _disk_cache = None
+
+
+def _get_disk_cache() -> DiskCache:
+    # One directory and one size budget for both kinds of entry
+    global _disk_cache
+    if _disk_cache is None:
+        _disk_cache = DiskCache(CACHE_DIR, CACHE_MAX_MB * 1024 * 1024)
+    return _disk_cache
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Return the process-wide extraction cache, or None if disabled."""
+    if not CACHE_ENABLED:
+        return None
+    return ExtractionCache(_get_disk_cache())
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """Return the process-wide rendered page cache, or None if disabled."""
+    if not CACHE_ENABLED:
+        return None
+    return PageCache(_get_disk_cache())
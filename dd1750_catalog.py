@@ -0,0 +1,255 @@
+"""
+NSN Catalog for DD1750 Extraction
+SQLite index of known NIINs and nomenclature for checking and correcting OCR'd NSNs
+"""
+
+import os
+import re
+import csv
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Optional, Iterator, Tuple
+
+from dd1750_cache import file_sha256
+
+
+# CSV (niin/nsn + nomenclature columns) or a prebuilt .db; empty disables the catalog
+CATALOG_PATH = os.environ.get('DD1750_CATALOG_PATH', '')
+
+# Opt-in: text-layer items whose NSN and nomenclature both match the
+# catalog skip manual review (the catalog says nothing about quantities,
+# so OCR'd items are always reviewed)
+CATALOG_AUTO_VERIFY = os.environ.get('DD1750_CATALOG_AUTO_VERIFY', '0') == '1'
+
+# Minimum similarity (0-1) between OCR'd description and catalog nomenclature
+NOMENCLATURE_MATCH_RATIO = 0.8
+
+# Characters tesseract commonly reads in place of digits
+OCR_DIGIT_CONFUSIONS = str.maketrans({
+    'O': '0', 'o': '0', 'D': '0', 'Q': '0',
+    'I': '1', 'l': '1', 'i': '1', '|': '1',
+    'S': '5', 's': '5',
+    'B': '8',
+    'Z': '2', 'z': '2',
+})
+
+# A token that might be a NIIN once confusions are fixed
+NIIN_CANDIDATE = re.compile(r'^[0-9OoDQIli|SsBZz]{8,9}$')
+
+# A near-NIIN token must already contain this many real digits
+MIN_NIIN_DIGITS = 6
+
+
+def normalize_niin(token: str) -> Optional[str]:
+    """
+    Return the digits a NIIN-like token was meant to be, or None.
+
+    '58O01234S' -> '580012345'. Tokens with fewer than MIN_NIIN_DIGITS
+    real digits are words, not misread numbers.
+    """
+    if not NIIN_CANDIDATE.match(token):
+        return None
+    if sum(c.isdigit() for c in token) < MIN_NIIN_DIGITS:
+        return None
+    return token.translate(OCR_DIGIT_CONFUSIONS)
+
+
+def niin_from_nsn(value: str) -> Optional[str]:
+    """Catalog rows may hold a 13-digit NSN (5820-01-234-5678) or a bare NIIN."""
+    digits = re.sub(r'\D', '', value)
+    if len(digits) == 13:
+        return digits[4:]
+    if len(digits) in (8, 9):
+        return digits.zfill(9)
+    return None
+
+
+def normalize_nomenclature(text: str) -> str:
+    return ' '.join(re.sub(r'[^A-Z0-9]+', ' ', text.upper()).split())
+
+
+def nomenclature_matches(nomenclature: str, description: str) -> bool:
+    a, b = normalize_nomenclature(nomenclature), normalize_nomenclature(description)
+    if not a or not b:
+        return False
+    return a == b or SequenceMatcher(None, a, b).ratio() >= NOMENCLATURE_MATCH_RATIO
+
+
+def _substitution_masks(niin: str) -> Iterator[str]:
+    """'123' -> '?23', '1?3', '12?': one mask per single-digit substitution."""
+    for i in range(len(niin)):
+        yield niin[:i] + '?' + niin[i + 1:]
+
+
+@dataclass
+class CatalogMatch:
+    niin: str
+    nomenclature: str
+    exact: bool  # False: nearest NIIN one edit away from what was read
+    description_match: bool
+
+
+class NSNCatalog:
+    """
+    Read-only NIIN -> nomenclature index in SQLite.
+
+    Besides the exact table, every NIIN is stored under its nine
+    single-substitution masks ('5?0012345' ...), so candidates one digit
+    away are an indexed lookup rather than a scan. The same masks cover
+    reads that dropped a digit (insert '?' into the 8-digit read) and,
+    with plain exact lookups, reads with one extra digit.
+
+    Connections are per thread; worker processes open their own.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def build(source_path: str, db_path: str) -> int:
+        """
+        Build an index from a CSV with a niin (or nsn) column and a
+        nomenclature (or description) column. Written to a temp file and
+        renamed into place, so concurrent builders never see a partial DB.
+
+        Returns:
+            Number of NIINs indexed
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(db_path)), suffix='.tmp')
+        os.close(fd)
+        count = 0
+
+        try:
+            conn = sqlite3.connect(tmp_path)
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("CREATE TABLE niins (niin TEXT PRIMARY KEY, nomenclature TEXT NOT NULL) WITHOUT ROWID")
+            conn.execute("CREATE TABLE niin_masks (mask TEXT NOT NULL, niin TEXT NOT NULL)")
+
+            with open(source_path, newline='', encoding='utf-8-sig') as f:
+                reader = csv.DictReader(f)
+                fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+                niin_col = fields.get('niin') or fields.get('nsn')
+                name_col = fields.get('nomenclature') or fields.get('description') or fields.get('name')
+                if niin_col is None or name_col is None:
+                    raise ValueError(f"Catalog {source_path} needs niin/nsn and nomenclature columns")
+
+                for record in reader:
+                    niin = niin_from_nsn(record.get(niin_col) or '')
+                    if niin is None:
+                        continue
+                    nomenclature = (record.get(name_col) or '').strip()
+                    cursor = conn.execute("INSERT OR IGNORE INTO niins VALUES (?, ?)", (niin, nomenclature))
+                    if cursor.rowcount:
+                        conn.executemany("INSERT INTO niin_masks VALUES (?, ?)",
+                                         ((mask, niin) for mask in _substitution_masks(niin)))
+                        count += 1
+
+            conn.execute("CREATE INDEX idx_niin_masks ON niin_masks (mask)")
+            conn.commit()
+            conn.close()
+            os.replace(tmp_path, db_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        return count
+
+    def lookup(self, niin: str) -> Optional[str]:
+        """Nomenclature for an exact NIIN, or None."""
+        row = self._conn().execute("SELECT nomenclature FROM niins WHERE niin = ?", (niin,)).fetchone()
+        return row[0] if row else None
+
+    def neighbours(self, read: str) -> Tuple[Tuple[str, str], ...]:
+        """Catalog (niin, nomenclature) pairs one substitution, insertion or deletion from `read`."""
+        conn = self._conn()
+        found = {}
+
+        if len(read) == 9:
+            masks = list(_substitution_masks(read))
+        elif len(read) == 8:
+            masks = [read[:i] + '?' + read[i:] for i in range(9)]
+        else:
+            masks = []
+
+        if masks:
+            placeholders = ','.join('?' * len(masks))
+            for niin, nomenclature in conn.execute(
+                    f"SELECT n.niin, n.nomenclature FROM niin_masks m JOIN niins n ON n.niin = m.niin "
+                    f"WHERE m.mask IN ({placeholders})", masks):
+                found[niin] = nomenclature
+
+        if len(read) == 10:
+            for i in range(10):
+                niin = read[:i] + read[i + 1:]
+                nomenclature = self.lookup(niin)
+                if nomenclature is not None:
+                    found[niin] = nomenclature
+
+        found.pop(read, None)
+        return tuple(found.items())
+
+    def match(self, niin: str, description: str = '') -> Optional[CatalogMatch]:
+        """
+        Check an extracted NIIN against the catalog.
+
+        An exact hit (or the same NIIN with its leading zero restored) is
+        returned as exact. Otherwise the nearest NIIN one edit away is
+        returned, but only if it is the only one, or the only one whose
+        nomenclature agrees with the description; ambiguous reads give None.
+        """
+        candidates = [niin.zfill(9)] if len(niin) == 8 else []
+        for candidate in [niin] + candidates:
+            nomenclature = self.lookup(candidate)
+            if nomenclature is not None:
+                return CatalogMatch(candidate, nomenclature, True,
+                                    nomenclature_matches(nomenclature, description))
+
+        neighbours = self.neighbours(niin)
+        if len(neighbours) > 1 and description:
+            neighbours = tuple(n for n in neighbours if nomenclature_matches(n[1], description))
+        if len(neighbours) != 1:
+            return None
+
+        candidate, nomenclature = neighbours[0]
+        return CatalogMatch(candidate, nomenclature, False, nomenclature_matches(nomenclature, description))
+
+
+_catalog: Optional[NSNCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Optional[NSNCatalog]:
+    """
+    Return the process-wide catalog, or None if DD1750_CATALOG_PATH is unset.
+
+    A CSV is indexed once into the temp directory under its content hash,
+    so every worker and restart reuses the same DB until the CSV changes.
+    """
+    global _catalog
+    if not CATALOG_PATH:
+        return None
+
+    with _catalog_lock:
+        if _catalog is None:
+            if CATALOG_PATH.endswith(('.db', '.sqlite')):
+                db_path = CATALOG_PATH
+            else:
+                digest = file_sha256(CATALOG_PATH)[:16]
+                db_path = os.path.join(tempfile.gettempdir(), f"dd1750-catalog-{digest}.db")
+                if not os.path.exists(db_path):
+                    count = NSNCatalog.build(CATALOG_PATH, db_path)
+                    print(f"Indexed {count} NIINs from {CATALOG_PATH}")
+            _catalog = NSNCatalog(db_path)
+    return _catalog
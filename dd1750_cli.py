@@ -0,0 +1,174 @@
+"""
+Command-line Bulk Processing for DD1750 Generator
+Converts a directory of BOMs to item lists and DD1750s (or one ZIP of packets) without the web app
+"""
+
+import os
+import csv
+import sys
+import json
+import glob
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import List, Dict, Optional
+
+from dd1750_batch import BatchResult, process_bom, process_batch, packet_names
+from dd1750_cache import configure_extraction_cache, CACHE_DIR
+from dd1750_ocr import ExtractedItem, PREPROCESS_PROFILES, OCR_WORKERS, generate_review_report, configure_ocr_pool
+
+
+CSV_FIELDS = ['line_no', 'nsn', 'description', 'qty', 'nsn_confidence', 'description_confidence',
+              'qty_confidence', 'needs_review', 'source_page', 'source_pages', 'review_notes']
+
+
+def find_boms(inputs: List[str], recursive: bool = False) -> List[str]:
+    """Expand files and directories to a sorted, de-duplicated list of PDFs."""
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            pattern = os.path.join(path, '**', '*') if recursive else os.path.join(path, '*')
+            paths.extend(p for p in glob.glob(pattern, recursive=recursive)
+                         if os.path.isfile(p) and p.lower().endswith('.pdf'))
+        else:
+            paths.append(path)
+    return sorted(set(paths), key=paths.index)
+
+
+def write_items_json(items: List[ExtractedItem], path: str):
+    with open(path, 'w') as f:
+        json.dump([asdict(item) for item in items], f, indent=2)
+
+
+def write_items_csv(items: List[ExtractedItem], path: str):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for item in items:
+            row = {name: getattr(item, name) for name in CSV_FIELDS}
+            row['review_notes'] = '; '.join(item.review_notes)
+            row['source_pages'] = ';'.join(str(page) for page in item.source_pages)
+            writer.writerow(row)
+
+
+def write_outputs(result: BatchResult, output_dir: str, formats: List[str]) -> Dict:
+    """Write one BOM's item files, report and DD1750; returns its summary entry."""
+    stem = result.packet[:-len('_DD1750.pdf')]
+    files = []
+
+    if result.items:
+        if 'json' in formats:
+            files.append(f"{stem}_items.json")
+            write_items_json(result.items, os.path.join(output_dir, files[-1]))
+        if 'csv' in formats:
+            files.append(f"{stem}_items.csv")
+            write_items_csv(result.items, os.path.join(output_dir, files[-1]))
+
+        files.append(f"{stem}_review.txt")
+        with open(os.path.join(output_dir, files[-1]), 'w') as f:
+            f.write(generate_review_report(result.items))
+
+    if result.pdf is not None:
+        files.append(result.packet)
+        with open(os.path.join(output_dir, files[-1]), 'wb') as f:
+            f.write(result.pdf)
+
+    return {
+        'bom': result.name,
+        'items': len(result.items),
+        'needs_review': result.needs_review,
+        'files': files,
+        'error': result.error,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Extract items from BOM PDFs and generate DD1750s, without the web app.")
+    parser.add_argument('inputs', nargs='+', help="BOM PDFs and/or directories of them")
+    parser.add_argument('-o', '--output-dir', default='dd1750_output', help="Directory to write results to")
+    parser.add_argument('-t', '--template', help="Blank DD1750 template PDF; without it only items are written")
+    parser.add_argument('--zip', dest='zip_path', default=None,
+                        help="Write the DD1750s and one combined review report to this ZIP instead "
+                             "(as POST /batch does); needs --template")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Search directories recursively")
+    parser.add_argument('--format', choices=['json', 'csv', 'both'], default='json', help="Item list format")
+    parser.add_argument('--jobs', type=int, default=1, help="BOMs processed at once")
+    parser.add_argument('--workers', type=int, default=OCR_WORKERS, help="Pages OCR'd concurrently per BOM")
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help="Size of the shared OCR process pool (default OCR_MAX_WORKERS)")
+    parser.add_argument('--dpi', type=int, default=None, help="OCR rasterization resolution (default 300)")
+    parser.add_argument('--profile', choices=['auto'] + list(PREPROCESS_PROFILES), default=None,
+                        help="OCR preprocessing profile (default OCR_PROFILE)")
+    parser.add_argument('--cache-dir', default=None, help=f"Extraction cache directory (default {CACHE_DIR})")
+    parser.add_argument('--no-cache', action='store_true', help="Do not read or write the extraction cache")
+    parser.add_argument('--consolidate', action='store_true', default=None,
+                        help="Merge rows repeating an NSN and description (default DD1750_CONSOLIDATE)")
+    return parser
+
+
+def write_zip(boms: List[str], template: bytes, args: argparse.Namespace) -> int:
+    """--zip mode: one ZIP of packets plus the combined review report (see process_batch)."""
+    summary = process_batch([(os.path.basename(path), path) for path in boms], template, args.zip_path,
+                            workers=args.workers, profile=args.profile, dpi=args.dpi,
+                            concurrency=args.jobs, consolidate=args.consolidate)
+    for bom in summary['boms']:
+        status = f"ERROR: {bom['error']}" if bom['error'] else \
+            f"{bom['items']} items, {bom['needs_review']} need review"
+        print(f"{bom['name']}: {status}")
+    print(f"Wrote {args.zip_path}")
+
+    return 1 if any(bom['error'] for bom in summary['boms']) else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.zip_path and not args.template:
+        parser.error("--zip needs --template")
+
+    boms = find_boms(args.inputs, args.recursive)
+    if not boms:
+        print("No BOM PDFs found", file=sys.stderr)
+        return 2
+
+    configure_extraction_cache(directory=args.cache_dir, enabled=False if args.no_cache else None)
+    configure_ocr_pool(max_workers=args.max_workers)
+
+    template = None
+    if args.template:
+        with open(args.template, 'rb') as f:
+            template = f.read()
+
+    if args.zip_path:
+        return write_zip(boms, template, args)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    formats = ['json', 'csv'] if args.format == 'both' else [args.format]
+    names = packet_names([os.path.basename(path) for path in boms])
+
+    print(f"Processing {len(boms)} BOM(s), {args.jobs} at a time, {args.workers} OCR worker(s) each")
+
+    summary = []
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs), thread_name_prefix='dd1750-cli') as executor:
+        futures = [
+            executor.submit(process_bom, os.path.basename(path), packet, path, template,
+                            args.workers, args.profile, args.dpi, args.consolidate)
+            for path, packet in zip(boms, names)
+        ]
+        for future in futures:
+            entry = write_outputs(future.result(), args.output_dir, formats)
+            summary.append(entry)
+            status = f"ERROR: {entry['error']}" if entry['error'] else \
+                f"{entry['items']} items, {entry['needs_review']} need review"
+            print(f"{entry['bom']}: {status}")
+
+    with open(os.path.join(args.output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Wrote results for {len(summary)} BOM(s) to {args.output_dir}")
+
+    return 1 if any(entry['error'] for entry in summary) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,12 +4,21 @@ Generates DD1750 forms from verified items
 """
 
 import io
-import math
-from typing import List
-from pypdf import PdfReader, PdfWriter
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Union, BinaryIO, Tuple, Optional, Sequence, Iterable
+from pypdf import PdfReader, PdfWriter, PageObject
 from reportlab.pdfgen import canvas
+from pdf2image import convert_from_bytes
 import pdfplumber
 
+from dd1750_cache import get_page_cache
+from dd1750_metrics import get_metrics
+
 
 # DD1750 Form Layout Constants
 ROWS_PER_PAGE = 18
@@ -27,6 +36,63 @@ Y_TABLE_BOTTOM_LINE = 89.5
 ROW_H = (Y_TABLE_TOP_LINE - Y_TABLE_BOTTOM_LINE) / ROWS_PER_PAGE
 PAD_X = 3.0
 
+# Parsed templates kept per process, keyed by content hash
+TEMPLATE_CACHE_SIZE = 8
+
+# Part of every cached overlay page's key; bump whenever draw_page_items
+# changes what a page looks like so pages in the old layout are not reused
+LAYOUT_VERSION = 2
+
+# Resolution of PNG page previews; thumbnails, so kept low
+PREVIEW_DPI = int(os.environ.get('DD1750_PREVIEW_DPI', 72))
+
+_template_cache = OrderedDict()
+_template_cache_lock = threading.Lock()
+
+
+class CachedTemplate:
+    """A parsed template plus a lock, since PdfReader resolves objects lazily."""
+    
+    def __init__(self, data: bytes, sha256: str):
+        self.reader = PdfReader(io.BytesIO(data))
+        self.sha256 = sha256
+        self.lock = threading.Lock()
+    
+    @property
+    def page(self) -> PageObject:
+        return self.reader.pages[0]
+
+
+def load_template(template: Union[str, bytes]) -> CachedTemplate:
+    """
+    Return the parsed template, parsing it only the first time its content is seen.
+    
+    Keyed by SHA-256 of the template bytes, so the standard blank DD1750 is
+    parsed once per process no matter how many uploads carry it.
+    
+    Args:
+        template: Path to the template PDF, or its raw bytes
+    """
+    if isinstance(template, bytes):
+        data = template
+    else:
+        with open(template, 'rb') as f:
+            data = f.read()
+    key = hashlib.sha256(data).hexdigest()
+    
+    with _template_cache_lock:
+        template = _template_cache.get(key)
+        if template is not None:
+            _template_cache.move_to_end(key)
+            return template
+    
+    template = CachedTemplate(data, key)
+    with _template_cache_lock:
+        _template_cache[key] = template
+        while len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+    return template
+
 
 def detect_bom_format(pdf_path: str) -> str:
     """
@@ -56,99 +122,284 @@ def detect_bom_format(pdf_path: str) -> str:
         return 'UNKNOWN'
 
 
-def generate_dd1750_from_verified_items(items: List, template_path: str, output_path: str):
+def draw_page_items(can: canvas.Canvas, page_items: List):
+    """Draw one DD1750 page's worth of items (at most ROWS_PER_PAGE) onto the canvas."""
+    first_row_top = Y_TABLE_TOP_LINE - 5.0
+    
+    for i, item in enumerate(page_items):
+        y = first_row_top - (i * ROW_H)
+        y_desc = y - 7.0
+        y_nsn = y - 12.2
+        
+        # Box number (line number)
+        can.setFont("Helvetica", 8)
+        can.drawCentredString((X_BOX_L + X_BOX_R)/2, y_desc, str(item.line_no))
+        
+        # Description
+        can.setFont("Helvetica", 7)
+        desc = item.description[:50] if len(item.description) > 50 else item.description
+        can.drawString(X_CONTENT_L + PAD_X, y_desc, desc)
+        
+        # NSN (if available)
+        if item.nsn:
+            can.setFont("Helvetica", 6)
+            can.drawString(X_CONTENT_L + PAD_X, y_nsn, f"NSN: {item.nsn}")
+        
+        # Unit of Issue (EA = Each)
+        can.setFont("Helvetica", 8)
+        can.drawCentredString((X_UOI_L + X_UOI_R)/2, y_desc, "EA")
+        
+        # Initial Operation quantity
+        can.drawCentredString((X_INIT_L + X_INIT_R)/2, y_desc, str(item.qty))
+        
+        # Running Spares (always 0 for our use case)
+        can.drawCentredString((X_SPARES_L + X_SPARES_R)/2, y_desc, "0")
+        
+        # Total quantity (same as initial for our use case)
+        can.drawCentredString((X_TOTAL_L + X_TOTAL_R)/2, y_desc, str(item.qty))
+
+
+def page_slices(items: List) -> List[List]:
+    """Split items into the ROWS_PER_PAGE-item slices drawn on each output page."""
+    return [items[i:i + ROWS_PER_PAGE] for i in range(0, len(items), ROWS_PER_PAGE)]
+
+
+def page_slice_hash(page_items: List) -> str:
+    """Hash exactly what draw_page_items draws for one page's items."""
+    digest = hashlib.sha256()
+    for item in page_items:
+        row = [item.line_no, item.description[:50], item.nsn, item.qty]
+        digest.update(json.dumps(row).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def render_overlays(pages: List[List]) -> PdfReader:
+    """
+    Render the item overlay for the given output pages in one canvas document.
+    
+    Args:
+        pages: Item slices, one per page (see page_slices)
+    
+    Returns:
+        Reader over the overlay PDF, one page per slice
+    """
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet, pagesize=(PAGE_W, PAGE_H))
+    
+    for page_items in pages:
+        draw_page_items(can, page_items)
+        can.showPage()
+    
+    can.save()
+    packet.seek(0)
+    return PdfReader(packet)
+
+
+def write_pdf(writer: PdfWriter, output: Union[str, BinaryIO]):
+    """Write to a path or to an already-open binary file object."""
+    if isinstance(output, str):
+        with open(output, 'wb') as f:
+            writer.write(f)
+    else:
+        writer.write(output)
+
+
+def merge_onto_template(writer: PdfWriter, template: CachedTemplate, overlay_pages: Iterable[PageObject]):
+    """
+    Add one output page per overlay page, each with the shared template
+    page merged underneath it.
+    
+    Every page refers to the template's resources, so the writer stores
+    them once however many pages there are. Each overlay page is a
+    distinct object, so the cached template page is never mutated. The
+    page takes the template's boxes and rotation rather than the
+    overlay's letter-size media box.
+    """
+    with template.lock:
+        for overlay_page in overlay_pages:
+            page = writer.add_page(overlay_page)
+            page.merge_page(template.page, over=False)
+            page.mediabox = template.page.mediabox
+            page.cropbox = template.page.cropbox
+            if template.page.rotation:
+                page.rotation = template.page.rotation
+
+
+def render_pages(items: List, template: CachedTemplate,
+                 page_nums: Optional[Sequence[int]] = None) -> List[bytes]:
+    """
+    Item overlays of output pages, each as a one-page PDF without the template.
+    
+    Pages already in the page cache are returned as stored; the rest are
+    drawn in a single canvas pass and cached. After an edit only the page
+    holding the changed row is re-rendered. Only the overlay is cached, a
+    few KB of text, so the template's resources are not stored (or later
+    written) once per page; see merge_onto_template.
+    
+    Args:
+        items: All ExtractedItem objects in the packet
+        template: Parsed template from load_template (part of the cache key)
+        page_nums: 0-based pages to return (default: all)
+    """
+    slices = page_slices(items)
+    if page_nums is None:
+        page_nums = range(len(slices))
+    
+    cache = get_page_cache()
+    metrics = get_metrics()
+    layout = f"v{LAYOUT_VERSION}"
+    hashes = {n: page_slice_hash(slices[n]) for n in page_nums}
+    pages = {}
+    
+    if cache is not None:
+        for n in page_nums:
+            pdf = cache.get_page(template.sha256, hashes[n], layout)
+            metrics.inc('dd1750_cache_lookups_total', cache='page', result='hit' if pdf is not None else 'miss')
+            if pdf is not None:
+                pages[n] = pdf
+    
+    dirty = [n for n in dict.fromkeys(page_nums) if n not in pages]
+    if dirty:
+        overlays = render_overlays([slices[n] for n in dirty])
+        for n, overlay_page in zip(dirty, overlays.pages):
+            writer = PdfWriter()
+            writer.add_page(overlay_page)
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            pages[n] = buffer.getvalue()
+            if cache is not None:
+                cache.put_page(template.sha256, hashes[n], layout, pages[n])
+    
+    return [pages[n] for n in page_nums]
+
+
+def render_page(items: List, template: CachedTemplate, page_num: int) -> bytes:
+    """One finished output page (items over the template) as a one-page PDF."""
+    overlay = render_pages(items, template, [page_num])[0]
+    writer = PdfWriter()
+    merge_onto_template(writer, template, PdfReader(io.BytesIO(overlay)).pages)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def render_preview(items: List, template: Union[str, bytes], page_num: int,
+                   fmt: str = 'png', dpi: int = PREVIEW_DPI) -> bytes:
+    """
+    Render a single output page for preview, as a one-page PDF or a PNG.
+    
+    Only the requested page is drawn (see render_page), so a preview costs
+    one page of work however long the packet is. PNGs are cached next to
+    the rendered page and keyed the same way plus their DPI.
+    
+    Args:
+        items: All ExtractedItem objects in the packet
+        template: Path to the template PDF, or its bytes
+        page_num: 0-based output page
+        fmt: 'png' or 'pdf'
+    
+    Raises:
+        IndexError: page_num is not a page of this packet
+    """
+    slices = page_slices(items)
+    if not 0 <= page_num < len(slices):
+        raise IndexError(f"Page {page_num + 1} does not exist (packet has {len(slices)} pages)")
+    
+    cached_template = load_template(template)
+    if fmt == 'pdf':
+        return render_page(items, cached_template, page_num)
+    
+    cache = get_page_cache()
+    slice_hash = page_slice_hash(slices[page_num])
+    layout = f"v{LAYOUT_VERSION}-png{dpi}"
+    if cache is not None:
+        png = cache.get_page(cached_template.sha256, slice_hash, layout)
+        get_metrics().inc('dd1750_cache_lookups_total', cache='preview', result='hit' if png is not None else 'miss')
+        if png is not None:
+            return png
+    
+    pdf = render_page(items, cached_template, page_num)
+    image = convert_from_bytes(pdf, dpi=dpi)[0]
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    png = buffer.getvalue()
+    
+    if cache is not None:
+        cache.put_page(cached_template.sha256, slice_hash, layout, png)
+    return png
+
+
+def generate_dd1750_from_verified_items(items: List, template_path: Union[str, bytes],
+                                        output_path: Union[str, BinaryIO]):
     """
     Generate DD1750 from verified ExtractedItem objects.
     
     Args:
         items: List of ExtractedItem objects (already verified)
-        template_path: Path to blank DD1750 template
-        output_path: Where to save the generated DD1750
+        template_path: Path to blank DD1750 template, or its bytes
+        output_path: Where to save the generated DD1750 (path or binary file object)
+    
+    Returns:
+        Tuple of (output_path, items_written)
     """
+    metrics = get_metrics()
+    started = time.perf_counter()
+    
     try:
+        template = load_template(template_path)
+        writer = PdfWriter()
+        
         if not items:
             # If no items, just copy template
-            reader = PdfReader(template_path)
-            writer = PdfWriter()
-            writer.add_page(reader.pages[0])
-            with open(output_path, 'wb') as f:
-                writer.write(f)
+            with template.lock:
+                writer.add_page(template.page)
+            write_pdf(writer, output_path)
             return output_path, 0
         
-        total_pages = math.ceil(len(items) / ROWS_PER_PAGE)
-        writer = PdfWriter()
+        if get_page_cache() is not None:
+            # Unchanged pages' overlays come straight from the page cache
+            overlay_pages = [PdfReader(io.BytesIO(pdf)).pages[0] for pdf in render_pages(items, template)]
+        else:
+            overlay_pages = render_overlays(page_slices(items)).pages
         
-        for page_num in range(total_pages):
-            start_idx = page_num * ROWS_PER_PAGE
-            end_idx = min((page_num + 1) * ROWS_PER_PAGE, len(items))
-            page_items = items[start_idx:end_idx]
-            
-            # Create overlay with item data
-            packet = io.BytesIO()
-            can = canvas.Canvas(packet, pagesize=(PAGE_W, PAGE_H))
-            
-            first_row_top = Y_TABLE_TOP_LINE - 5.0
-            
-            for i, item in enumerate(page_items):
-                y = first_row_top - (i * ROW_H)
-                y_desc = y - 7.0
-                y_nsn = y - 12.2
-                
-                # Box number (line number)
-                can.setFont("Helvetica", 8)
-                can.drawCentredString((X_BOX_L + X_BOX_R)/2, y_desc, str(item.line_no))
-                
-                # Description
-                can.setFont("Helvetica", 7)
-                desc = item.description[:50] if len(item.description) > 50 else item.description
-                can.drawString(X_CONTENT_L + PAD_X, y_desc, desc)
-                
-                # NSN (if available)
-                if item.nsn:
-                    can.setFont("Helvetica", 6)
-                    can.drawString(X_CONTENT_L + PAD_X, y_nsn, f"NSN: {item.nsn}")
-                
-                # Unit of Issue (EA = Each)
-                can.setFont("Helvetica", 8)
-                can.drawCentredString((X_UOI_L + X_UOI_R)/2, y_desc, "EA")
-                
-                # Initial Operation quantity
-                can.drawCentredString((X_INIT_L + X_INIT_R)/2, y_desc, str(item.qty))
-                
-                # Running Spares (always 0 for our use case)
-                can.drawCentredString((X_SPARES_L + X_SPARES_R)/2, y_desc, "0")
-                
-                # Total quantity (same as initial for our use case)
-                can.drawCentredString((X_TOTAL_L + X_TOTAL_R)/2, y_desc, str(item.qty))
-            
-            can.save()
-            packet.seek(0)
-            
-            # Merge overlay with template
-            overlay = PdfReader(packet)
-            page = PdfReader(template_path).pages[0]
-            page.merge_page(overlay.pages[0])
-            writer.add_page(page)
+        merge_onto_template(writer, template, overlay_pages)
         
         # Write final PDF
-        with open(output_path, 'wb') as f:
-            writer.write(f)
+        write_pdf(writer, output_path)
         
+        metrics.observe('dd1750_request_seconds', time.perf_counter() - started, operation='generate')
         return output_path, len(items)
         
     except Exception as e:
+        metrics.inc('dd1750_errors_total', where='generate')
         print(f"CRITICAL ERROR in DD1750 generation: {e}")
         import traceback
         traceback.print_exc()
         
         # Fallback: return blank template
         try:
-            reader = PdfReader(template_path)
+            if not isinstance(output_path, str):
+                output_path.seek(0)
+                output_path.truncate()
+            source = io.BytesIO(template_path) if isinstance(template_path, bytes) else template_path
+            reader = PdfReader(source)
             writer = PdfWriter()
             writer.add_page(reader.pages[0])
-            with open(output_path, 'wb') as f:
-                writer.write(f)
+            write_pdf(writer, output_path)
         except:
             pass
         
         return output_path, 0
+
+
+def generate_dd1750_bytes(items: List, template: Union[str, bytes]) -> Tuple[bytes, int]:
+    """
+    Generate a DD1750 entirely in memory.
+    
+    Returns:
+        Tuple of (pdf_bytes, items_written)
+    """
+    buffer = io.BytesIO()
+    _, count = generate_dd1750_from_verified_items(items, template, buffer)
+    return buffer.getvalue(), count
@@ -0,0 +1,286 @@
+"""
+Extraction Engine for DD1750 BOMs
+Reads the PDF text layer where one exists and falls back to OCR per page
+"""
+
+import os
+import time
+from typing import List, Dict, Tuple, Optional, Callable
+
+import pdfplumber
+
+from dd1750_core import detect_bom_format
+from dd1750_cache import get_extraction_cache, file_sha256
+from dd1750_metrics import get_metrics
+from dd1750_ocr import (
+    ExtractedItem,
+    PageWords,
+    extract_table_from_text,
+    build_extracted_items,
+    consolidate_items,
+    ocr_pages,
+    ocr_backend_name,
+    OCR_WORKERS,
+    OCR_PROFILE,
+    OCR_ADAPTIVE_DPI,
+    OCR_FIRST_PASS_DPI,
+    OCR_RECHECK_CONFIDENCE,
+    OCR_TABLE_CROP,
+    OCR_LANG,
+    PREPROCESS_PROFILES,
+    PIPELINE_VERSION,
+)
+
+
+# A page needs at least this much text to be parsed from its text layer
+MIN_TEXT_CHARS = 50
+
+# Words whose tops are within this many points belong to the same line
+LINE_TOLERANCE = 3.0
+
+# Confidence given to words read from the text layer (they are exact)
+TEXT_LAYER_CONFIDENCE = 100
+
+# Rasterization resolution for OCR fallback pages
+OCR_DPI = 300
+
+# Merge rows repeating an NSN and description unless a caller says otherwise
+CONSOLIDATE_DUPLICATES = os.environ.get('DD1750_CONSOLIDATE', '0') == '1'
+
+
+def group_words_into_lines(words: List[Dict], tolerance: float = LINE_TOLERANCE) -> List[List[Dict]]:
+    """
+    Group pdfplumber words into visual lines, left to right.
+
+    Args:
+        words: Output of pdfplumber's page.extract_words()
+        tolerance: Max vertical distance (points) between words on one line
+
+    Returns:
+        Lines of words, top to bottom
+    """
+    lines = []
+    current_line = []
+    current_top = None
+
+    for word in sorted(words, key=lambda w: (round(w['top']), w['x0'])):
+        if current_top is None or abs(word['top'] - current_top) > tolerance:
+            if current_line:
+                lines.append(sorted(current_line, key=lambda w: w['x0']))
+            current_line = [word]
+            current_top = word['top']
+        else:
+            current_line.append(word)
+
+    if current_line:
+        lines.append(sorted(current_line, key=lambda w: w['x0']))
+
+    return lines
+
+
+def extract_text_layer(page, page_num: int = 0) -> Tuple[str, PageWords]:
+    """
+    Read a pdfplumber page's text layer in the same shape as
+    extract_text_with_confidence returns for OCR.
+
+    Returns:
+        Tuple of (text, words) with boxes in PDF points
+    """
+    lines = group_words_into_lines(page.extract_words(keep_blank_chars=False, use_text_flow=False))
+    ordered = [word for line in lines for word in line]
+
+    line_indices = []
+    next_index = 0
+    for line in lines:
+        line_indices.append(list(range(next_index, next_index + len(line))))
+        next_index += len(line)
+
+    words = PageWords(
+        page_num,
+        [word['text'] for word in ordered],
+        [TEXT_LAYER_CONFIDENCE] * len(ordered),
+        [word['x0'] for word in ordered],
+        [word['top'] for word in ordered],
+        [word['x1'] - word['x0'] for word in ordered],
+        [word['bottom'] - word['top'] for word in ordered],
+        line_indices,
+    )
+
+    return words.to_text(), words
+
+
+def extraction_config(dpi: int, profile: str, bom_format: str) -> str:
+    """
+    Every setting that changes what a page extracts to, as part of its
+    extraction cache key; the OCR engine is the one actually in use.
+    """
+    adaptive = f"adaptive{OCR_FIRST_PASS_DPI}@{OCR_RECHECK_CONFIDENCE:g}" if OCR_ADAPTIVE_DPI else "fixed"
+    crop = "crop" if OCR_TABLE_CROP else "nocrop"
+    return (f"v{PIPELINE_VERSION}|dpi{dpi}|{adaptive}|{profile}|{crop}"
+            f"|{ocr_backend_name()}-{OCR_LANG}|{bom_format}")
+
+
+def extract_items(pdf_path: str, start_page: int = 0, end_page: Optional[int] = None,
+                  workers: Optional[int] = None,
+                  bom_format: Optional[str] = None,
+                  use_cache: bool = True,
+                  profile: Optional[str] = None,
+                  dpi: Optional[int] = None,
+                  progress: Optional[Callable[[int, int, int], None]] = None,
+                  timings: Optional[Dict[str, float]] = None,
+                  consolidate: Optional[bool] = None) -> List[ExtractedItem]:
+    """
+    Extract items from a BOM, choosing the cheapest source per page.
+
+    Pages with a usable text layer are parsed directly from pdfplumber
+    words (milliseconds per page). Only pages without one are rasterized
+    and OCR'd. IMAGE_BASED documents go straight to OCR.
+
+    Per-page results are cached by BOM content hash (see dd1750_cache),
+    so a repeat upload skips extraction entirely and a partly cached
+    document only processes its missing pages.
+
+    Args:
+        pdf_path: Path to the BOM PDF
+        start_page: First page to extract (0-based)
+        end_page: Page to stop before (0-based, exclusive); None = last page
+        workers: Pages OCR'd concurrently; defaults to OCR_WORKERS
+        bom_format: Result of detect_bom_format, detected if not given
+        use_cache: Read and write the extraction cache if it is enabled
+        profile: OCR preprocessing profile ('auto' or a PREPROCESS_PROFILES
+            name); defaults to OCR_PROFILE
+        dpi: OCR rasterization resolution; defaults to OCR_DPI
+        progress: Called as progress(page_num, pages_done, total_pages)
+            each time a page's items are available
+        timings: If given, seconds per stage are added to it, summed over
+            pages ('text_layer' plus ocr_page's stages, e.g. 'ocr')
+        consolidate: Merge rows repeating an NSN and description across
+            the document (see consolidate_items); defaults to
+            CONSOLIDATE_DUPLICATES. Applied after the cache, so it never
+            changes what is cached.
+
+    Stage times, page/item counts, cache lookups and errors are also
+    recorded in the process metrics (see dd1750_metrics).
+
+    Returns:
+        ExtractedItem list, numbered in page order
+    """
+    if bom_format is None:
+        bom_format = detect_bom_format(pdf_path)
+    if workers is None:
+        workers = OCR_WORKERS
+    if profile is None:
+        profile = OCR_PROFILE
+    if dpi is None:
+        dpi = OCR_DPI
+    if consolidate is None:
+        consolidate = CONSOLIDATE_DUPLICATES
+    if profile != 'auto' and profile not in PREPROCESS_PROFILES:
+        raise ValueError(f"Unknown preprocessing profile: {profile}")
+
+    print(f"\n{'='*80}")
+    print(f"EXTRACTION ENGINE - {bom_format}")
+    print(f"{'='*80}")
+
+    metrics = get_metrics()
+    started_extract = time.perf_counter()
+
+    cache = get_extraction_cache() if use_cache else None
+    config = extraction_config(dpi, profile, bom_format)
+    bom_hash = None
+
+    page_rows = {}
+    ocr_needed = []
+    cache_hits = 0
+    total = 0
+
+    def add_time(stage: str, seconds: float):
+        metrics.observe('dd1750_stage_seconds', seconds, stage=stage)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def page_done(page_num: int):
+        if progress is not None:
+            progress(page_num, len(page_rows), total)
+
+    try:
+        if cache:
+            bom_hash = file_sha256(pdf_path)
+
+        with pdfplumber.open(pdf_path) as pdf:
+            total_pages = len(pdf.pages)
+            if end_page is None or end_page > total_pages:
+                end_page = total_pages
+            total = max(0, end_page - start_page)
+
+            for page_num in range(start_page + 1, end_page + 1):
+                if cache:
+                    entry = cache.get_page(bom_hash, page_num, config)
+                    metrics.inc('dd1750_cache_lookups_total', cache='extract', result='hit' if entry is not None else 'miss')
+                    if entry is not None:
+                        page_rows[page_num] = (entry['source'], entry['rows'])
+                        cache_hits += 1
+                        metrics.inc('dd1750_pages_total', source='cache')
+                        page_done(page_num)
+                        continue
+
+                if bom_format == 'IMAGE_BASED':
+                    ocr_needed.append(page_num)
+                    continue
+
+                started = time.perf_counter()
+                page = pdf.pages[page_num - 1]
+                text, words = extract_text_layer(page, page_num)
+                page.close()
+
+                if len(text.strip()) < MIN_TEXT_CHARS:
+                    add_time('text_layer', time.perf_counter() - started)
+                    print(f"  Page {page_num}: no usable text layer, queued for OCR")
+                    ocr_needed.append(page_num)
+                    continue
+
+                rows = extract_table_from_text(text, words)
+                add_time('text_layer', time.perf_counter() - started)
+                page_rows[page_num] = ('TEXT', rows)
+                metrics.inc('dd1750_pages_total', source='text')
+                if cache:
+                    cache.put_page(bom_hash, page_num, config, 'TEXT', rows)
+                print(f"  Page {page_num}: {len(rows)} items from text layer")
+                page_done(page_num)
+
+        if cache_hits:
+            print(f"  {cache_hits} page(s) served from extraction cache")
+
+        if ocr_needed:
+            print(f"\nOCR fallback for {len(ocr_needed)} page(s)")
+            for page_num, rows, stats in ocr_pages(pdf_path, ocr_needed, dpi=dpi,
+                                                   workers=workers, profile=profile):
+                for stage, seconds in stats['timings'].items():
+                    add_time(stage, seconds)
+                page_rows[page_num] = ('OCR', rows)
+                metrics.inc('dd1750_pages_total', source='ocr')
+                if cache:
+                    cache.put_page(bom_hash, page_num, config, 'OCR', rows)
+                page_done(page_num)
+
+    except Exception as e:
+        metrics.inc('dd1750_errors_total', where='extract')
+        print(f"\nERROR during extraction: {e}")
+        import traceback
+        traceback.print_exc()
+
+    items = []
+    for page_num in sorted(page_rows):
+        source, rows = page_rows[page_num]
+        items.extend(build_extracted_items(rows, len(items) + 1, source=source))
+    if consolidate:
+        items = consolidate_items(items)
+
+    metrics.inc('dd1750_items_total', len(items))
+    metrics.observe('dd1750_request_seconds', time.perf_counter() - started_extract, operation='extract')
+
+    print(f"\nEXTRACTION COMPLETE: {len(items)} items "
+          f"({cache_hits} cached, {len(ocr_needed)} OCR'd, "
+          f"{len(page_rows) - cache_hits - len(ocr_needed)} from text layer)\n")
+
+    return items
@@ -0,0 +1,181 @@
+"""
+Versioned Item Lists for DD1750 Review
+Server-held item list edited by small patches with optimistic concurrency
+"""
+
+import copy
+from typing import List, Dict, Tuple, Optional, Any
+
+from dd1750_ocr import validate_nsn, validate_quantity
+
+
+# Fields a reviewer may change, with the type each must have
+EDITABLE_FIELDS = {
+    'description': str,
+    'nsn': str,
+    'qty': int,
+    'needs_review': bool,
+    'review_notes': list,
+}
+
+# Defaults for items a reviewer inserts by hand
+NEW_ITEM = {
+    'description': '',
+    'nsn': '',
+    'qty': 1,
+    'description_confidence': 100.0,
+    'nsn_confidence': 100.0,
+    'qty_confidence': 100.0,
+    'needs_review': True,
+    'review_notes': ['Added manually'],
+    'source_page': 0,
+    'source_pages': [],
+}
+
+
+class PatchError(ValueError):
+    """A patch operation is malformed or refers to an unknown item."""
+
+
+class VersionConflict(Exception):
+    """The patch was made against an older version of the list."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Items changed since version was read (now version {current_version})")
+        self.current_version = current_version
+
+
+def new_item_document(items: List[Dict], version: int = 1) -> Dict:
+    """
+    Wrap item dicts (asdict(ExtractedItem) shape) in a versioned document.
+
+    Every item gets an 'id' that never changes while it exists, so patches
+    can address it regardless of inserts, deletes and moves. IDs already
+    present are kept, as strings (patches look IDs up as strings).
+    """
+    doc = {'version': version, 'next_id': 1, 'items': []}
+    taken = {str(item['id']) for item in items if item.get('id')}
+    for item in items:
+        item = dict(item)
+        if not item.get('id'):
+            while str(doc['next_id']) in taken:
+                doc['next_id'] += 1
+            item['id'] = str(doc['next_id'])
+            doc['next_id'] += 1
+        else:
+            item['id'] = str(item['id'])
+        doc['items'].append(item)
+    doc['next_id'] = max([doc['next_id']] + [int(i) + 1 for i in taken if i.isdigit()])
+    renumber(doc['items'])
+    return doc
+
+
+def next_version(old_doc: Optional[Dict]) -> int:
+    """Version for a list that replaces old_doc (None, or a pre-versioning list)."""
+    return old_doc['version'] + 1 if isinstance(old_doc, dict) else 1
+
+
+def renumber(items: List[Dict]):
+    for line_no, item in enumerate(items, 1):
+        item['line_no'] = line_no
+
+
+def _index_of(items: List[Dict], item_id: Any) -> int:
+    for index, item in enumerate(items):
+        if item['id'] == str(item_id):
+            return index
+    raise PatchError(f"Unknown item id: {item_id}")
+
+
+def _insert_position(items: List[Dict], after: Optional[Any]) -> int:
+    """Index just after item `after`; None means the top of the list."""
+    return 0 if after is None else _index_of(items, after) + 1
+
+
+def _apply_fields(item: Dict, fields: Dict):
+    """
+    Set reviewer-edited fields, with the same confidence rules as the review
+    page: a corrected description or a valid NSN/quantity is now certain.
+    """
+    if not isinstance(fields, dict) or not fields:
+        raise PatchError("'fields' must be a non-empty object")
+
+    for name, value in fields.items():
+        expected = EDITABLE_FIELDS.get(name)
+        if expected is None:
+            raise PatchError(f"Field cannot be edited: {name}")
+        if (expected is int and isinstance(value, bool)) or not isinstance(value, expected):
+            raise PatchError(f"Field {name} must be {expected.__name__}")
+        item[name] = value
+
+    if 'description' in fields:
+        item['description_confidence'] = 100.0
+    if 'nsn' in fields:
+        valid, _ = validate_nsn(fields['nsn'])
+        item['nsn_confidence'] = 100.0 if valid else 50.0
+    if 'qty' in fields:
+        valid, _, confidence = validate_quantity(str(fields['qty']))
+        item['qty_confidence'] = confidence if valid else 0.0
+
+
+def apply_patch(doc: Dict, ops: List[Dict], base_version: int) -> Tuple[Dict, List[str], List[Dict]]:
+    """
+    Apply operations to a copy of the document, all or nothing.
+
+    Operations, addressed by item id:
+        {'op': 'edit', 'id': ..., 'fields': {...}}
+        {'op': 'insert', 'after': id or None, 'item': {...}}
+        {'op': 'delete', 'id': ...}
+        {'op': 'move', 'id': ..., 'after': id or None}
+
+    Raises:
+        VersionConflict: base_version is not the document's version
+        PatchError: an operation is invalid; nothing is applied
+
+    Returns:
+        (new_doc, inserted_ids, changed_items) where changed_items are the
+        edited/inserted items as stored. Line numbers follow list order.
+    """
+    if doc['version'] != base_version:
+        raise VersionConflict(doc['version'])
+    if not isinstance(ops, list) or not ops:
+        raise PatchError("'ops' must be a non-empty list")
+
+    doc = copy.deepcopy(doc)
+    items = doc['items']
+    inserted = []
+    changed = set()
+
+    for op in ops:
+        kind = op.get('op') if isinstance(op, dict) else None
+
+        if kind == 'edit':
+            item = items[_index_of(items, op.get('id'))]
+            _apply_fields(item, op.get('fields'))
+            changed.add(item['id'])
+
+        elif kind == 'insert':
+            item = dict(NEW_ITEM, review_notes=list(NEW_ITEM['review_notes']), id=str(doc['next_id']))
+            doc['next_id'] += 1
+            if op.get('item'):
+                _apply_fields(item, op['item'])
+            items.insert(_insert_position(items, op.get('after')), item)
+            inserted.append(item['id'])
+            changed.add(item['id'])
+
+        elif kind == 'delete':
+            item = items.pop(_index_of(items, op.get('id')))
+            changed.discard(item['id'])
+
+        elif kind == 'move':
+            item = items.pop(_index_of(items, op.get('id')))
+            if op.get('after') == item['id']:
+                raise PatchError("Cannot move an item after itself")
+            items.insert(_insert_position(items, op.get('after')), item)
+
+        else:
+            raise PatchError(f"Unknown operation: {kind!r}")
+
+    renumber(items)
+    doc['version'] += 1
+    return doc, inserted, [item for item in items if item['id'] in changed]
@@ -0,0 +1,138 @@
+"""
+Background Extraction Jobs for DD1750 Generator
+Runs long extractions off the request thread and records per-page progress
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from dd1750_store import SessionStore
+from dd1750_metrics import get_metrics
+from dd1750_admission import AdmissionController, get_admission_controller
+
+
+# Extraction jobs running concurrently per gunicorn worker
+JOB_THREADS = int(os.environ.get('DD1750_JOB_THREADS', 2))
+
+FINISHED_STATUSES = ('done', 'error')
+
+
+class JobManager:
+    """
+    Runs job functions on a local thread pool.
+
+    Job state lives in the session store under the job ID, so any gunicorn
+    worker can answer status polls for a job another worker is running.
+    Only the thread running a job writes its state, so read-modify-write
+    updates do not race.
+
+    A job function is called as fn(*args, progress=callback, **kwargs) and
+    must return a JSON-serializable result. The callback takes
+    (page_num, pages_done, total_pages) and appends a progress event.
+
+    Jobs submitted with a memory cost go through admission control (see
+    dd1750_admission): they stay 'queued', with a live queue_position,
+    until the host has memory for them.
+    """
+
+    def __init__(self, store: SessionStore, max_workers: int = JOB_THREADS,
+                 admission: Optional[AdmissionController] = None):
+        self.store = store
+        self.admission = admission or get_admission_controller()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dd1750-job')
+
+    def submit(self, owner: str, fn: Callable, *args, cost_mb: Optional[float] = None, **kwargs) -> str:
+        """
+        Queue fn and return its job ID immediately.
+
+        Raises:
+            QueueFull: cost_mb was given and the admission queue is full
+        """
+        job_id = self.store.new_id()
+        position = self.admission.enqueue(job_id, cost_mb) if cost_mb is not None else None
+        now = time.time()
+        self.store.put_json(job_id, 'job', {
+            'id': job_id,
+            'owner': owner,
+            'status': 'queued',
+            'created': now,
+            'updated': now,
+            'pages_done': 0,
+            'total_pages': None,
+            'cost_mb': round(cost_mb) if cost_mb is not None else None,
+            'queue_position': position,
+            'events': [],
+            'result': None,
+            'error': None,
+        })
+        self.executor.submit(self._run, job_id, fn, args, kwargs, cost_mb is not None)
+        return job_id
+
+    def get(self, job_id: str, owner: Optional[str]) -> Optional[Dict]:
+        """
+        Return job state, or None if unknown, expired or owned by someone
+        else. A missing owner (no session) owns nothing.
+        """
+        if owner is None or not self.store.valid_id(job_id):
+            return None
+        job = self.store.get_json(job_id, 'job')
+        if job is None or job['owner'] != owner:
+            return None
+        if job['status'] == 'queued' and job.get('cost_mb') is not None:
+            job['queue_position'] = self.admission.position(job_id)
+        return job
+
+    def _update(self, job_id: str, event: Optional[Dict] = None, **changes):
+        job = self.store.get_json(job_id, 'job')
+        if job is None:
+            return
+        job.update(changes)
+        if event is not None:
+            job['events'].append(event)
+        job['updated'] = time.time()
+        self.store.put_json(job_id, 'job', job)
+
+    def _run(self, job_id: str, fn: Callable, args, kwargs, admitted: bool):
+        def queued(position: int):
+            self._update(job_id, queue_position=position, event={'type': 'queued', 'position': position})
+
+        def progress(page_num: int, pages_done: int, total_pages: int):
+            self._update(
+                job_id,
+                pages_done=pages_done,
+                total_pages=total_pages,
+                event={'type': 'page', 'page': page_num, 'done': pages_done, 'total': total_pages},
+            )
+
+        try:
+            if admitted:
+                self.admission.wait(job_id, on_position=queued)
+            self._update(job_id, status='running', queue_position=0, event={'type': 'started'})
+
+            result = fn(*args, progress=progress, **kwargs)
+            self._update(job_id, status='done', result=result, event={'type': 'done'})
+        except Exception as e:
+            get_metrics().inc('dd1750_errors_total', where='job')
+            print(f"Error in job {job_id}: {e}")
+            import traceback
+            traceback.print_exc()
+            self._update(job_id, status='error', error=str(e), event={'type': 'error', 'error': str(e)})
+        finally:
+            if admitted:
+                self.admission.release(job_id)
+
+
+_job_manager: Optional[JobManager] = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager(store: SessionStore) -> JobManager:
+    """Return the process-wide job manager, creating it on first use."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager(store)
+    return _job_manager
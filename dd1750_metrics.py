@@ -0,0 +1,246 @@
+"""
+Pipeline Metrics for DD1750 Generator
+Counters and latency histograms, exposed in Prometheus text format
+"""
+
+import os
+import glob
+import atexit
+import json
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Tuple, Optional
+
+
+METRICS_ENABLED = os.environ.get('DD1750_METRICS', '1') != '0'
+METRICS_DIR = os.environ.get('DD1750_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'dd1750-metrics'))
+
+# Seconds between snapshot writes per process
+FLUSH_INTERVAL = 1.0
+
+# Histogram bucket upper bounds in seconds (+Inf is implicit)
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# name -> (type, help); anything recorded must be listed here
+METRICS = {
+    'dd1750_stage_seconds': ('histogram', 'Time per page in each pipeline stage'),
+    'dd1750_request_seconds': ('histogram', 'Time per whole operation (extract, generate, batch)'),
+    'dd1750_pages_total': ('counter', 'BOM pages extracted, by source'),
+    'dd1750_items_total': ('counter', 'Items extracted'),
+    'dd1750_cache_lookups_total': ('counter', 'Extraction and page cache lookups, by cache and result'),
+    'dd1750_errors_total': ('counter', 'Errors, by where they were caught'),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (k + '="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    """Exact sample value: whole numbers as integers, others at full precision."""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms.
+
+    gunicorn runs several workers and a scrape reaches only one, so every
+    process writes its snapshot to METRICS_DIR/<pid>.json (at most every
+    FLUSH_INTERVAL seconds, atomically) and render() sums the snapshots of
+    all live processes. Snapshots of exited processes are deleted, which
+    Prometheus sees as an ordinary counter reset.
+    """
+
+    def __init__(self, directory: str = METRICS_DIR):
+        self.directory = directory
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        # Per label set: [count per bucket..., +Inf count, sum]
+        self.histograms: Dict[str, Dict[LabelKey, list]] = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._flush_timer: Optional[threading.Timer] = None
+        os.makedirs(directory, exist_ok=True)
+        # The flush timer is a daemon thread and dies with the process, so
+        # short-lived processes (CLI, batch runs) write their last updates here
+        atexit.register(self.flush_pending)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+        self.flush()
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            buckets = series.setdefault(key, [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[len(LATENCY_BUCKETS)] += 1
+            buckets[-1] += seconds
+        self.flush()
+
+    @contextmanager
+    def timed(self, name: str, **labels):
+        """Observe the block's wall time, whether or not it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'counters': {name: [[list(key), value] for key, value in series.items()]
+                             for name, series in self.counters.items()},
+                'histograms': {name: [[list(key), list(buckets)] for key, buckets in series.items()]
+                               for name, series in self.histograms.items()},
+            }
+
+    def flush(self, force: bool = False):
+        """
+        Write this process's snapshot if FLUSH_INTERVAL has passed (or
+        force); otherwise make sure a write is scheduled, so the last
+        update before a quiet spell is never lost.
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_flush < FLUSH_INTERVAL:
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(FLUSH_INTERVAL, self.flush, kwargs={'force': True})
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+            self._last_flush = now
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, os.path.join(self.directory, f"{os.getpid()}.json"))
+        except OSError as e:
+            print(f"Error writing metrics snapshot: {e}")
+
+    def flush_pending(self):
+        """Write the snapshot now if a scheduled write has not happened yet."""
+        with self._lock:
+            pending = self._flush_timer is not None
+        if pending:
+            self.flush(force=True)
+
+    def _merged(self) -> Tuple[Dict, Dict]:
+        counters: Dict[str, Dict[LabelKey, float]] = {}
+        histograms: Dict[str, Dict[LabelKey, list]] = {}
+
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            pid = int(os.path.basename(path)[:-len('.json')])
+            if pid != os.getpid():
+                try:
+                    os.kill(pid, 0)
+                except ProcessLookupError:
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                    continue
+                except PermissionError:
+                    pass
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            for name, series in snapshot['counters'].items():
+                merged = counters.setdefault(name, {})
+                for key, value in series:
+                    key = tuple(tuple(pair) for pair in key)
+                    merged[key] = merged.get(key, 0.0) + value
+            for name, series in snapshot['histograms'].items():
+                merged = histograms.setdefault(name, {})
+                for key, buckets in series:
+                    key = tuple(tuple(pair) for pair in key)
+                    total = merged.setdefault(key, [0] * len(buckets))
+                    merged[key] = [a + b for a, b in zip(total, buckets)]
+
+        return counters, histograms
+
+    def render(self) -> str:
+        """Prometheus text exposition of all live processes' metrics."""
+        self.flush(force=True)
+        counters, histograms = self._merged()
+        lines = []
+
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            if kind == 'counter':
+                for key, value in sorted(counters.get(name, {}).items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+                continue
+
+            for key, buckets in sorted(histograms.get(name, {}).items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                cumulative += buckets[len(LATENCY_BUCKETS)]
+                lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {buckets[-1]:.6f}")
+                lines.append(f"{name}_count{_format_labels(key)} {cumulative}")
+
+        return '\n'.join(lines) + '\n'
+
+
+class _NullRegistry:
+    """Stand-in when DD1750_METRICS=0; records nothing."""
+
+    def inc(self, name: str, value: float = 1, **labels):
+        pass
+
+    def observe(self, name: str, seconds: float, **labels):
+        pass
+
+    @contextmanager
+    def timed(self, name: str, **labels):
+        yield
+
+    def render(self) -> str:
+        return ''
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return this process's registry, creating it on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry() if METRICS_ENABLED else _NullRegistry()
+    return _registry
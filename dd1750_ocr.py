@@ -3,15 +3,116 @@ OCR Module for DD1750 BOM Extraction
 Accuracy-First Design: All extractions require human verification
 """
 
+import os
 import re
+import time
+import threading
+import multiprocessing
+from collections import deque
+from itertools import islice
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import cv2
 import numpy as np
-from typing import List, Dict, Tuple, Optional
-from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, Iterator, Iterable, Sequence
+from dataclasses import dataclass, field, replace
 from pdf2image import convert_from_path
 from PIL import Image
 import pytesseract
 
+from dd1750_catalog import normalize_niin, get_catalog, CATALOG_AUTO_VERIFY
+
+try:
+    import tesserocr
+except ImportError:  # Optional: needs libtesseract headers to build
+    tesserocr = None
+
+
+# Bump whenever rasterization, preprocessing, OCR or parsing changes what a
+# page extracts to; it is part of every extraction cache key.
+PIPELINE_VERSION = 13
+
+# OCR engine: 'auto' (tesserocr when installed), 'tesserocr' or 'pytesseract'
+OCR_BACKEND = os.environ.get('OCR_BACKEND', 'auto')
+OCR_LANG = os.environ.get('OCR_LANG', 'eng')
+
+# Per-page OCR concurrency. OCR_WORKERS is the default per request and
+# OCR_MAX_WORKERS caps what a single request may ask for.
+OCR_MAX_WORKERS = int(os.environ.get('OCR_MAX_WORKERS', os.cpu_count() or 1))
+OCR_WORKERS = min(int(os.environ.get('OCR_WORKERS', 1)), OCR_MAX_WORKERS)
+
+# Preprocessing profile: 'auto' picks one per page from a noise estimate,
+# otherwise a name from PREPROCESS_PROFILES
+OCR_PROFILE = os.environ.get('OCR_PROFILE', 'auto')
+
+# Noise estimate (grey levels) below which a page counts as clean / above
+# which it is treated like a handwritten or heavily degraded scan
+CLEAN_NOISE_LEVEL = 2.0
+NOISY_NOISE_LEVEL = 6.0
+
+# Two-pass OCR: read the page at OCR_FIRST_PASS_DPI, then re-read only rows
+# with a field below OCR_RECHECK_CONFIDENCE at the full DPI
+OCR_ADAPTIVE_DPI = os.environ.get('OCR_ADAPTIVE_DPI', '0') == '1'
+OCR_FIRST_PASS_DPI = int(os.environ.get('OCR_FIRST_PASS_DPI', 200))
+OCR_RECHECK_CONFIDENCE = float(os.environ.get('OCR_RECHECK_CONFIDENCE', 80))
+
+# Crop each page to its ruled item table before denoising and OCR
+OCR_TABLE_CROP = os.environ.get('OCR_TABLE_CROP', '1') != '0'
+
+# A detected table must cover at least this fraction of the page
+MIN_TABLE_AREA_RATIO = 0.15
+
+# Column header words on component listings and what column they name
+HEADER_KEYWORDS = {
+    'NIIN': 'nsn', 'NSN': 'nsn', 'MATERIAL': 'nsn',
+    'DESCRIPTION': 'description', 'NOMENCLATURE': 'description',
+    'UI': 'ui', 'U/I': 'ui',
+    'AUTH': 'qty', 'QTY': 'qty',
+}
+
+# Admin/header text that is never an item description
+SKIP_KEYWORDS = ['COMPONENT LISTING', 'HAND RECEIPT', 'BASIC ISSUE', 'END ITEM', 'BTY', 'ADA BATTE']
+
+# All of SKIP_KEYWORDS in one pattern, so a description is scanned once
+SKIP_PATTERN = re.compile('|'.join(re.escape(keyword) for keyword in SKIP_KEYWORDS))
+
+# Unit-of-issue codes; on a row they end the description
+UNIT_OF_ISSUE_CODES = {'EA', 'PR', 'SE', 'KT', 'BX', 'RL', 'FT', 'GL', 'QT', 'PG', 'DZ', 'HD', 'LB', 'PK', 'SH', 'TU', 'CN', 'AY'}
+
+QTY_TOKEN = re.compile(r'^\d{1,4}$')
+
+# Every token the text parser cares about, classified in one scan per line:
+# an "Auth Qty: N" label, a NIIN (exact digits: the text layer is not OCR,
+# so letter/digit confusions are not corrected here), a small number, a model number
+# or measurement (capitals mixed with digits and / - . as in "LS-671/U",
+# "BA5590", "1/2"), or a capitalized word (possibly with commas/hyphens);
+# a comma or hyphen standing alone ("WRENCH , ADJUSTABLE") is a word too
+LINE_TOKEN = re.compile(r"""
+    (?P<auth>(?i:auth\s+qty)\s*[:\-]?\s*(?P<auth_qty>\d+))
+  | (?P<niin>\b\d{8,9}\b)
+  | (?P<num>\b\d{1,4}\b(?![A-Za-z/\-.]))
+  | (?P<model>(?<!\S)(?=[A-Z0-9/\-.,]*\d)(?=[A-Z0-9/\-.,]*[A-Z/])[A-Z0-9][A-Z0-9/\-.,]*(?!\S))
+  | (?P<word>\b[A-Z][A-Z,\-]*(?![a-z0-9])|(?<!\S)[,\-]+(?!\S))
+""", re.VERBOSE)
+
+# A description needs a word starting at least this many characters of
+# capitals, spaces, commas and hyphens, as the regex parser required
+# (see _description_qualifies)
+MIN_DESCRIPTION_CHARS = 11
+DESCRIPTION_TAIL = re.compile(r'[A-Z\s,\-]*')
+
+# Lines after an item row searched for its description (next line) and quantity
+LOOKAHEAD_LINES = 2
+
+# Spaces around commas/hyphens/slashes, ignored when comparing descriptions
+DESCRIPTION_PUNCT_SPACING = re.compile(r'\s*([,\-/])\s*')
+
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+
+_ocr_backend = None
+_ocr_backend_lock = threading.Lock()
+
 
 @dataclass
 class ExtractedItem:
@@ -30,6 +131,12 @@ class ExtractedItem:
     needs_review: bool = True
     review_notes: List[str] = field(default_factory=list)
     
+    # 1-based BOM page the item was read from (0 = unknown)
+    source_page: int = 0
+    
+    # Every page a consolidated item was read from (see consolidate_items)
+    source_pages: List[int] = field(default_factory=list)
+    
     @property
     def overall_confidence(self) -> float:
         """Calculate overall confidence score."""
@@ -41,6 +148,211 @@ class ExtractedItem:
         self.needs_review = True
 
 
+@dataclass(frozen=True)
+class PreprocessProfile:
+    """Named set of preprocessing choices; see PREPROCESS_PROFILES."""
+    name: str
+    clahe: bool = True
+    denoise: bool = True
+    denoise_strength: int = 10
+    # Denoise a copy scaled by this factor, then scale back (1.0 = full size)
+    denoise_scale: float = 1.0
+    # 'otsu' (global) or 'adaptive' (local, for uneven ink and lighting)
+    threshold: str = 'otsu'
+
+
+PREPROCESS_PROFILES = {
+    # Clean digital or laser-printed scans: no denoise at all
+    'fast': PreprocessProfile('fast', clahe=False, denoise=False),
+    # Typical photocopies: light denoise on a half-size copy
+    'balanced': PreprocessProfile('balanced', denoise_strength=7, denoise_scale=0.5),
+    # Handwritten or degraded pages: the original full-resolution pipeline
+    # with local thresholding for uneven pen pressure
+    'handwritten': PreprocessProfile('handwritten', threshold='adaptive'),
+}
+
+
+class PageWords:
+    """
+    Per-word records for one page, stored column-wise.
+    
+    Word i is (text[i], conf[i], left[i], top[i], width[i], height[i]) on
+    page `page`. Confidences and boxes are parallel numpy arrays, so a
+    page costs a handful of arrays instead of a dict per word, and
+    repeated words ("EA", "ASSY") each keep their own confidence.
+    `lines` holds word indices per text line in reading order; to_text()
+    renders exactly those lines, which lets parsers map character spans
+    back to the words they came from.
+    """
+    
+    __slots__ = ('page', 'text', 'conf', 'left', 'top', 'width', 'height', 'lines')
+    
+    def __init__(self, page: int, text: List[str], conf, left, top, width, height,
+                 lines: List[List[int]]):
+        self.page = page
+        self.text = text
+        self.conf = np.asarray(conf, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.float32)
+        self.top = np.asarray(top, dtype=np.float32)
+        self.width = np.asarray(width, dtype=np.float32)
+        self.height = np.asarray(height, dtype=np.float32)
+        self.lines = lines
+    
+    def __len__(self) -> int:
+        return len(self.text)
+    
+    @classmethod
+    def from_tesseract(cls, ocr_data: Dict, page: int = 0) -> 'PageWords':
+        """Build from image_to_data output (pytesseract DICT shape), dropping empty words."""
+        keep = [i for i, word in enumerate(ocr_data['text']) if word.strip()]
+        
+        lines = []
+        line_ids = {}
+        for word_idx, i in enumerate(keep):
+            key = (ocr_data['block_num'][i], ocr_data['par_num'][i], ocr_data['line_num'][i])
+            if key not in line_ids:
+                line_ids[key] = len(lines)
+                lines.append([])
+            lines[line_ids[key]].append(word_idx)
+        
+        return cls(
+            page,
+            [ocr_data['text'][i].strip() for i in keep],
+            [float(ocr_data['conf'][i]) for i in keep],
+            [ocr_data['left'][i] for i in keep],
+            [ocr_data['top'][i] for i in keep],
+            [ocr_data['width'][i] for i in keep],
+            [ocr_data['height'][i] for i in keep],
+            lines,
+        )
+    
+    def shift(self, dx: float, dy: float):
+        """Move all boxes, e.g. from crop coordinates back to page coordinates."""
+        self.left += dx
+        self.top += dy
+    
+    def to_text(self) -> str:
+        return '\n'.join(' '.join(self.text[i] for i in line) for line in self.lines)
+    
+    def mean_conf(self, indices: Sequence[int], default: float = 50.0) -> float:
+        """Average confidence of exactly these words."""
+        if len(indices) == 0:
+            return default
+        return float(self.conf[list(indices)].mean())
+    
+    def words_in_span(self, line_no: int, start: int, end: int) -> List[int]:
+        """Indices of the words on to_text() line `line_no` overlapping chars [start, end)."""
+        found = []
+        offset = 0
+        for i in self.lines[line_no]:
+            word_end = offset + len(self.text[i])
+            if word_end > start and offset < end:
+                found.append(i)
+            offset = word_end + 1
+        return found
+
+
+def render_page(pdf_path: str, page_num: int, dpi: int = 300) -> Image.Image:
+    """
+    Rasterize a single 1-based page straight to grayscale.
+    
+    poppler never touches other pages, and no RGB buffer is ever built.
+    """
+    return convert_from_path(pdf_path, dpi=dpi, first_page=page_num, last_page=page_num,
+                             grayscale=True)[0]
+
+
+def to_grayscale(image: Image.Image) -> np.ndarray:
+    """Convert a rasterized page to a single-channel OpenCV array."""
+    if image.mode == 'L':
+        return np.array(image)
+    return cv2.cvtColor(np.array(image.convert('RGB')), cv2.COLOR_RGB2GRAY)
+
+
+def estimate_noise(gray: np.ndarray) -> float:
+    """
+    Quick noise estimate (standard deviation, grey levels) of a page.
+    
+    Applies Immerkaer's Laplacian-difference kernel to every other pixel
+    (no averaging, so noise is not smoothed away) and takes a robust
+    median so the sparse edges of printed text do not count as noise.
+    Costs a few milliseconds even for a 300 DPI page.
+    """
+    sample = np.ascontiguousarray(gray[::2, ::2], dtype=np.float32)
+    if sample.shape[0] < 3 or sample.shape[1] < 3:
+        return 0.0
+    kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+    response = cv2.filter2D(sample, -1, kernel)[1:-1, 1:-1]
+    # The kernel's squared weights sum to 36, so response sigma is 6x pixel sigma
+    return float(1.4826 * np.median(np.abs(response)) / 6)
+
+
+def choose_profile(gray: np.ndarray, requested: str = 'auto') -> Tuple[PreprocessProfile, float]:
+    """
+    Resolve the preprocessing profile for a page.
+    
+    Returns:
+        Tuple of (profile, noise_estimate); noise is only measured for 'auto'
+    """
+    if requested != 'auto':
+        return PREPROCESS_PROFILES[requested], -1.0
+    
+    noise = estimate_noise(gray)
+    if noise < CLEAN_NOISE_LEVEL:
+        return PREPROCESS_PROFILES['fast'], noise
+    if noise < NOISY_NOISE_LEVEL:
+        return PREPROCESS_PROFILES['balanced'], noise
+    return PREPROCESS_PROFILES['handwritten'], noise
+
+
+def preprocess_gray(gray: np.ndarray, profile: Optional[PreprocessProfile] = None,
+                    timings: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    Contrast, denoise and binarize a grayscale page (or crop of one).
+    
+    Args:
+        gray: Single-channel image
+        profile: Which steps to run; defaults to the full 'handwritten' pipeline
+        timings: If given, seconds spent per stage are added to it
+    """
+    if profile is None:
+        profile = PREPROCESS_PROFILES['handwritten']
+    if timings is None:
+        timings = {}
+    
+    # Increase contrast using CLAHE (Contrast Limited Adaptive Histogram Equalization)
+    started = time.perf_counter()
+    if profile.clahe:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        gray = clahe.apply(gray)
+    timings['clahe'] = timings.get('clahe', 0.0) + time.perf_counter() - started
+    
+    # Denoise (optionally on a downscaled copy - it is by far the slowest step)
+    started = time.perf_counter()
+    if profile.denoise:
+        if profile.denoise_scale < 1.0:
+            height, width = gray.shape[:2]
+            small = cv2.resize(gray, None, fx=profile.denoise_scale, fy=profile.denoise_scale,
+                               interpolation=cv2.INTER_AREA)
+            small = cv2.fastNlMeansDenoising(small, None, profile.denoise_strength, 7, 21)
+            gray = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+        else:
+            gray = cv2.fastNlMeansDenoising(gray, None, profile.denoise_strength, 7, 21)
+    timings['denoise'] = timings.get('denoise', 0.0) + time.perf_counter() - started
+    
+    # Binarization
+    started = time.perf_counter()
+    if profile.threshold == 'adaptive':
+        binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv2.THRESH_BINARY, 31, 15)
+    else:
+        # Otsu's method automatically finds optimal threshold
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    timings['threshold'] = timings.get('threshold', 0.0) + time.perf_counter() - started
+    
+    return binary
+
+
 def preprocess_image(image: Image.Image) -> np.ndarray:
     """
     Preprocess image for better OCR accuracy.
@@ -51,65 +363,180 @@ def preprocess_image(image: Image.Image) -> np.ndarray:
     3. Denoise
     4. Binarize (black and white)
     """
-    # Convert PIL to OpenCV format
-    img = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    return preprocess_gray(to_grayscale(image))
+
+
+def detect_table_region(gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Find the ruled component table on a grayscale page.
     
-    # Convert to grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    Horizontal and vertical ruling lines are isolated with long, thin
+    morphological openings; the largest box they enclose is taken as the
+    item grid. This runs on the raw page and is far cheaper than the
+    denoise step it lets us skip for headers, signature blocks and margins.
     
-    # Increase contrast using CLAHE (Contrast Limited Adaptive Histogram Equalization)
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    contrast = clahe.apply(gray)
+    Returns:
+        (x, y, w, h) of the table in page pixels, or None if no ruled
+        table covering at least MIN_TABLE_AREA_RATIO of the page is found
+    """
+    height, width = gray.shape[:2]
     
-    # Denoise
-    denoised = cv2.fastNlMeansDenoising(contrast, None, 10, 7, 21)
+    # Ink becomes white on black so lines survive the opening
+    _, inverted = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
     
-    # Binarization - Otsu's method automatically finds optimal threshold
-    _, binary = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    horizontal = cv2.morphologyEx(
+        inverted, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(width // 30, 1), 1)))
+    vertical = cv2.morphologyEx(
+        inverted, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(height // 30, 1))))
     
-    return binary
+    grid = cv2.dilate(cv2.add(horizontal, vertical), np.ones((3, 3), np.uint8), iterations=2)
+    contours, _ = cv2.findContours(grid, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    
+    x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    if w * h < MIN_TABLE_AREA_RATIO * width * height:
+        return None
+    
+    # Keep a little margin so text touching the border is not clipped
+    pad = max(width, height) // 200
+    x, y = max(x - pad, 0), max(y - pad, 0)
+    w, h = min(w + 2 * pad, width - x), min(h + 2 * pad, height - y)
+    return x, y, w, h
 
 
-def extract_text_with_confidence(image: np.ndarray) -> Tuple[str, Dict]:
+class PytesseractBackend:
     """
-    Extract text from preprocessed image with confidence data.
+    Runs the tesseract CLI through pytesseract.
     
-    Returns:
-        Tuple of (extracted_text, confidence_data)
+    Every call writes the image to a temp file and starts a tesseract
+    process that reloads the language model, so it is the fallback.
     """
-    # Get detailed OCR data including confidence scores
-    ocr_data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
     
-    # Build text with confidence tracking
-    text_lines = []
-    confidence_map = {}
+    name = 'pytesseract'
     
-    current_line = []
-    current_line_num = -1
+    def image_to_data(self, image: np.ndarray) -> Dict[str, list]:
+        return pytesseract.image_to_data(image, lang=OCR_LANG, output_type=pytesseract.Output.DICT)
+
+
+class TesserocrBackend:
+    """
+    Long-lived in-process tesseract engine via the C API (tesserocr).
+    
+    The language model is loaded once per thread and images are handed
+    over as raw numpy buffers, so there is no process start, model load or
+    temp file per page. TessBaseAPI is not thread-safe, hence one engine
+    per thread (background job threads each get their own).
+    """
+    
+    name = 'tesserocr'
+    
+    def __init__(self, lang: str = OCR_LANG):
+        self.lang = lang
+        self._local = threading.local()
     
-    for i in range(len(ocr_data['text'])):
-        word = ocr_data['text'][i].strip()
-        conf = int(ocr_data['conf'][i])
-        line_num = ocr_data['line_num'][i]
+    def _api(self):
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=self.lang)
+            self._local.api = api
+        return api
+    
+    def image_to_data(self, image: np.ndarray) -> Dict[str, list]:
+        """Recognize a grayscale uint8 image; returns pytesseract's DICT shape."""
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
         
-        if word:  # Skip empty words
-            if line_num != current_line_num:
-                if current_line:
-                    text_lines.append(' '.join(current_line))
-                current_line = [word]
-                current_line_num = line_num
-            else:
-                current_line.append(word)
+        api = self._api()
+        api.SetImageBytes(image.tobytes(), width, height, 1, width)
+        api.Recognize()
+        
+        data = {key: [] for key in ('text', 'conf', 'left', 'top', 'width', 'height',
+                                    'block_num', 'par_num', 'line_num')}
+        level = tesserocr.RIL.WORD
+        block_num = par_num = line_num = 0
+        
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+        
+        while True:
+            if iterator.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                block_num += 1
+                par_num = line_num = 0
+            if iterator.IsAtBeginningOf(tesserocr.RIL.PARA):
+                par_num += 1
+                line_num = 0
+            if iterator.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                line_num += 1
             
-            # Track confidence for this word
-            confidence_map[word] = conf
+            box = iterator.BoundingBox(level)
+            text = iterator.GetUTF8Text(level)
+            if box is not None and text:
+                x1, y1, x2, y2 = box
+                data['text'].append(text)
+                data['conf'].append(iterator.Confidence(level))
+                data['left'].append(x1)
+                data['top'].append(y1)
+                data['width'].append(x2 - x1)
+                data['height'].append(y2 - y1)
+                data['block_num'].append(block_num)
+                data['par_num'].append(par_num)
+                data['line_num'].append(line_num)
+            
+            if not iterator.Next(level):
+                break
+        
+        return data
+
+
+def ocr_backend_name() -> str:
+    """Name of the engine OCR_BACKEND resolves to ('auto' decided by what is installed)."""
+    if OCR_BACKEND == 'tesserocr' or (OCR_BACKEND == 'auto' and tesserocr is not None):
+        return 'tesserocr'
+    return 'pytesseract'
+
+
+def get_ocr_backend():
+    """
+    Return this process's OCR engine, chosen by OCR_BACKEND.
     
-    if current_line:
-        text_lines.append(' '.join(current_line))
+    Created on first use, so each OCR pool worker keeps its own engine
+    (and loaded model) for its whole life.
+    """
+    global _ocr_backend
+    with _ocr_backend_lock:
+        if _ocr_backend is None:
+            if ocr_backend_name() == 'tesserocr':
+                if tesserocr is None:
+                    raise RuntimeError("OCR_BACKEND=tesserocr but tesserocr is not installed")
+                _ocr_backend = TesserocrBackend()
+            else:
+                _ocr_backend = PytesseractBackend()
+            print(f"  OCR backend: {_ocr_backend.name}")
+    return _ocr_backend
+
+
+def extract_text_with_confidence(image: np.ndarray, page: int = 0) -> Tuple[str, PageWords]:
+    """
+    Extract text from preprocessed image with per-word confidence data.
     
-    full_text = '\n'.join(text_lines)
+    Returns:
+        Tuple of (extracted_text, words) where the text is words.to_text()
+    """
+    words = extract_words(image, page)
+    return words.to_text(), words
+
+
+def extract_words(image: np.ndarray, page: int = 0) -> PageWords:
+    """
+    Run OCR and keep each word's confidence and geometry.
     
-    return full_text, confidence_map
+    Returns:
+        PageWords for the page (boxes in pixels)
+    """
+    ocr_data = get_ocr_backend().image_to_data(image)
+    return PageWords.from_tesseract(ocr_data, page)
 
 
 def validate_nsn(nsn: str) -> Tuple[bool, float]:
@@ -165,184 +592,902 @@ def validate_quantity(qty_str: str) -> Tuple[bool, int, float]:
     return True, qty, confidence
 
 
-def extract_table_from_text(text: str, confidence_map: Dict[str, int]) -> List[Dict]:
+class TextLine:
+    """One line of page text, tokenized once (see tokenize_line)."""
+    
+    __slots__ = ('page', 'index', 'text', 'niin', 'description', 'numbers', 'auth_qty')
+    
+    def __init__(self, page: int, index: int, text: str):
+        self.page = page
+        self.index = index  # Line number within its page, as in PageWords
+        self.text = text
+        self.niin = None  # (digits, start, end) of the first NIIN
+        self.description = None  # (start, end) of the description, LV and UI removed
+        self.numbers = []  # (value, start, end) of each 1-4 digit number
+        self.auth_qty = None
+
+
+def _description_span(text: str, run: List[Tuple[str, int, int]]) -> Optional[Tuple[int, int]]:
+    """
+    Trim a run of tokens to its description: it starts at a word beginning
+    with a letter, drops an LV code (A/B), trailing quantities and the unit
+    of issue before them, and any punctuation left at either end.
+    """
+    first = next((k for k, (kind, start, _) in enumerate(run)
+                  if kind in ('word', 'model') and text[start].isalpha()), None)
+    if first is None:
+        return None
+    run = run[first:]
+    if text[run[0][1]:run[0][2]] in UNIT_OF_ISSUE_CODES and all(kind == 'num' for kind, _, _ in run[1:]):
+        return None  # Just the UI and quantity columns
+    
+    # The unit of issue is the code right before the quantity columns
+    ui = next((k for k in range(1, len(run))
+               if text[run[k][1]:run[k][2]] in UNIT_OF_ISSUE_CODES
+               and all(kind == 'num' for kind, _, _ in run[k + 1:])), None)
+    if ui is None:
+        ui = next((k for k in range(1, len(run) - 1)
+                   if text[run[k][1]:run[k][2]] in UNIT_OF_ISSUE_CODES and run[k + 1][0] == 'num'), None)
+    if ui is not None:
+        run = run[:ui]
+    
+    while run and (run[-1][0] == 'num' or not text[run[-1][2] - 1].isalnum()):
+        run = run[:-1]
+    if len(run) > 1 and text[run[0][1]:run[0][2]] in ('A', 'B'):
+        run = run[1:]
+    if not run:
+        return None
+    return run[0][1], run[-1][2]
+
+
+def _description_qualifies(text: str, run: List[Tuple[str, int, int]], span: Tuple[int, int]) -> bool:
+    # As the regex parser matched: some word of the description starts
+    # MIN_DESCRIPTION_CHARS of capitals, spaces, commas and hyphens (which
+    # may run on into the unit of issue), so "SPEAKER LS-671/U" counts
+    # but "PRINTED 10/17/2026" does not
+    return any(DESCRIPTION_TAIL.match(text, start).end() - start >= MIN_DESCRIPTION_CHARS
+               for kind, start, _ in run if kind == 'word' and span[0] <= start < span[1])
+
+
+def tokenize_line(text: str, page: int = 0, index: int = 0) -> TextLine:
+    """
+    Classify a line's tokens in a single scan with LINE_TOKEN.
+    
+    Consecutive words, model numbers and numbers separated only by spaces
+    form a run. The first run whose description (see _description_span)
+    is long enough (see _description_qualifies) is the line's description.
+    """
+    line = TextLine(page, index, text)
+    run = []
+    
+    def close_run():
+        if run and line.description is None:
+            span = _description_span(text, run)
+            if span is not None and _description_qualifies(text, run, span):
+                line.description = span
+        run.clear()
+    
+    for match in LINE_TOKEN.finditer(text):
+        kind = match.lastgroup
+        
+        if kind == 'niin' and line.niin is None:
+            close_run()
+            line.niin = (match.group(), match.start(), match.end())
+        
+        if kind == 'num':
+            line.numbers.append((int(match.group()), match.start(), match.end()))
+        elif kind == 'auth' and line.auth_qty is None:
+            line.auth_qty = int(match.group('auth_qty'))
+        
+        if kind in ('word', 'model', 'num'):
+            if run and not text[run[-1][2]:match.start()].isspace():
+                close_run()
+            run.append((kind, match.start(), match.end()))
+        else:
+            close_run()
+    
+    close_run()
+    return line
+
+
+def _text_row(window: Sequence[TextLine], words: Optional[PageWords]) -> Optional[Dict]:
+    """Item row for window[0] if it holds one; later lines of the window are lookahead."""
+    line = window[0]
+    if line.niin is None:
+        return None
+    nsn, nsn_start, nsn_end = line.niin
+    
+    # Only lines of the same page, up to the next item row
+    following = []
+    for other in islice(window, 1, None):
+        if other.page != line.page or other.niin is not None:
+            break
+        following.append(other)
+    
+    # Description on this line, or else on the next (continuation lines);
+    # without one this is not an item row
+    desc_line = line
+    span = line.description
+    if span is None and following and following[0].description is not None:
+        desc_line = following[0]
+        span = desc_line.description
+    if span is None:
+        return None
+    
+    description = desc_line.text[span[0]:span[1]]
+    desc_end = span[1]
+    
+    # Skip admin/header items (descriptions that are clearly not items)
+    if SKIP_PATTERN.search(description.upper()):
+        return None
+    
+    # Quantity: an explicit "Auth Qty", else the last number after the
+    # description on this row, else on the lines below it
+    qty = 1  # Default
+    qty_confidence = 50.0  # Default if we can't find it
+    qty_value = next((l.auth_qty for l in [line] + following if l.auth_qty is not None), None)
+    if qty_value is None:
+        after = desc_end if desc_line is line else nsn_end
+        same_row = [n for n, start, _ in line.numbers if start >= after]
+        if same_row:
+            qty_value = same_row[-1]
+        else:
+            for other in following:
+                below = [n for n, _, _ in other.numbers if 1 <= n <= 100]
+                if below:
+                    qty_value = below[-1]
+                    break
+    
+    if qty_value is not None:
+        _, qty, qty_confidence = validate_quantity(str(qty_value))
+    
+    # Calculate confidence scores
+    nsn_valid, nsn_conf = validate_nsn(nsn)
+    
+    # Description confidence from the OCR confidences of the exact words used
+    if words is not None:
+        desc_words = words.words_in_span(desc_line.index, span[0], span[1])
+        desc_conf = words.mean_conf(desc_words)
+    else:
+        desc_conf = 50.0
+    if words is not None:
+        nsn_words = words.words_in_span(line.index, nsn_start, nsn_end)
+        nsn_conf = min(nsn_conf, words.mean_conf(nsn_words, default=nsn_conf))
+    
+    return {
+        'nsn': nsn,
+        'description': description,
+        'qty': qty,
+        'nsn_confidence': nsn_conf,
+        'description_confidence': desc_conf,
+        'qty_confidence': qty_confidence,
+        'page': line.page,
+        'review_notes': [],
+    }
+
+
+def iter_text_rows(lines: Iterable[str], words: Optional[PageWords] = None,
+                   page: Optional[int] = None) -> Iterator[Dict]:
+    """
+    Streaming BOM text parser; yields item rows as their lines arrive.
+    
+    Each line is tokenized once and kept only while it is within
+    LOOKAHEAD_LINES of the line being parsed, so cost is linear in the text
+    and memory constant however long the stream. A line starting with a
+    form feed ('\f', as pdftotext separates pages) begins the next page;
+    rows never take fields from another page.
+    
+    Args:
+        lines: Lines of text, e.g. a file object or a generator over pages
+        words: Word boxes for single-page text (text == words.to_text())
+        page: Page number of the first line (default words.page, or 0)
+    """
+    if page is None:
+        page = words.page if words is not None else 0
+    window = deque()
+    index = 0
+    
+    for text in lines:
+        text = text.rstrip('\r\n')
+        if text.startswith('\f'):
+            while window:
+                row = _text_row(window, words)
+                if row is not None:
+                    yield row
+                window.popleft()
+            page += len(text) - len(text.lstrip('\f'))
+            text = text.lstrip('\f')
+            index = 0
+        
+        window.append(tokenize_line(text, page, index))
+        index += 1
+        
+        if len(window) > LOOKAHEAD_LINES:
+            row = _text_row(window, words)
+            if row is not None:
+                yield row
+            window.popleft()
+    
+    while window:
+        row = _text_row(window, words)
+        if row is not None:
+            yield row
+        window.popleft()
+
+
+def extract_table_from_text(text: str, words: Optional[PageWords] = None) -> List[Dict]:
     """
     Parse OCR'd text to extract table data.
     
-    This is the intelligent parser that understands BOM structure.
+    This is the intelligent parser that understands BOM structure; see
+    iter_text_rows for the streaming form used on whole documents.
+    
+    When `words` is given (and text is words.to_text()), confidences come
+    from the exact words a field was read from; otherwise every word
+    counts as 50%.
     """
-    lines = text.split('\n')
-    items = []
+    return list(iter_text_rows(text.split('\n'), words))
+
+
+def ocr_image(image: Image.Image, page_num: int = 0, profile: str = 'auto',
+              timings: Optional[Dict[str, float]] = None) -> Tuple[List[Dict], str]:
+    """
+    Run the per-page pipeline on one rasterized page.
+    
+    to_grayscale -> detect_table_region (crop) -> choose_profile
+    -> preprocess_gray -> extract_words -> extract_table_from_words
+    
+    Args:
+        image: Rasterized page
+        page_num: 1-based page number recorded on the words and rows
+        profile: 'auto' or a PREPROCESS_PROFILES name
+        timings: If given, seconds spent per stage are added to it
+    
+    Returns:
+        Tuple of (rows in page order, name of the profile used)
+    """
+    if timings is None:
+        timings = {}
+    
+    started = time.perf_counter()
+    gray = to_grayscale(image)
+    
+    # Only the item grid needs the expensive pixel work
+    x, y = 0, 0
+    region = detect_table_region(gray) if OCR_TABLE_CROP else None
+    if region is not None:
+        x, y, w, h = region
+        print(f"  Table region: {w}x{h} at ({x}, {y}) of {gray.shape[1]}x{gray.shape[0]}")
+        gray = gray[y:y + h, x:x + w]
+    
+    chosen, noise = choose_profile(gray, profile)
+    timings['analyze'] = time.perf_counter() - started
+    
+    # Preprocess image
+    print(f"  Preprocessing image for OCR (profile: {chosen.name}"
+          + (f", noise {noise:.1f})..." if noise >= 0 else ")..."))
+    processed = preprocess_gray(gray, chosen, timings)
+    del gray
+    
+    # Extract words with confidence and position (in page coordinates)
+    print("  Running OCR...")
+    started = time.perf_counter()
+    words = extract_words(processed, page_num)
+    words.shift(x, y)
+    del processed
+    timings['ocr'] = time.perf_counter() - started
+    
+    print(f"  Recognized {len(words)} words")
+    
+    # Parse table structure from word geometry
+    print("  Parsing table structure...")
+    started = time.perf_counter()
+    page_items = extract_table_from_words(words)
+    timings['parse'] = time.perf_counter() - started
+    
+    print(f"  Found {len(page_items)} potential items")
+    return page_items, chosen.name
+
+
+FIELD_LABELS = {'nsn': 'NSN', 'description': 'Description', 'qty': 'Quantity'}
+
+
+def recheck_rows(pdf_path: str, page_num: int, rows: List[Dict], first_dpi: int, dpi: int,
+                 profile: PreprocessProfile, timings: Dict[str, float]) -> int:
+    """
+    Re-OCR low-confidence rows at high resolution and merge the results.
     
-    # Look for patterns that indicate a BOM item row
-    # Pattern: Material/NIIN, then Description, then quantities
+    The page is rendered once at `dpi`; each row whose weakest field is
+    below OCR_RECHECK_CONFIDENCE is cropped from it (boxes scaled from the
+    first pass) and read again. A field is replaced only when the re-read
+    is more confident, and every re-read row gets a review note saying
+    what changed. Rows are updated in place.
     
-    for i, line in enumerate(lines):
-        # Look for NIIN (8-9 digit number)
-        nsn_matches = re.findall(r'\b(\d{8,9})\b', line)
+    Returns:
+        Number of rows re-read
+    """
+    weak = [row for row in rows
+            if 'box' in row and min(row[f'{name}_confidence'] for name in FIELD_LABELS) < OCR_RECHECK_CONFIDENCE]
+    if not weak:
+        return 0
+    
+    started = time.perf_counter()
+    image = render_page(pdf_path, page_num, dpi)
+    gray = to_grayscale(image)
+    image.close()
+    timings['rasterize_recheck'] = time.perf_counter() - started
+    
+    scale = dpi / first_dpi
+    height, width = gray.shape[:2]
+    started = time.perf_counter()
+    
+    for row in weak:
+        x0, y0, x1, y1 = (value * scale for value in row['box'])
+        pad = (y1 - y0) * 0.5
+        x0, y0 = int(max(x0 - pad, 0)), int(max(y0 - pad, 0))
+        x1, y1 = int(min(x1 + pad, width)), int(min(y1 + pad, height))
         
-        if not nsn_matches:
+        words = extract_words(preprocess_gray(gray[y0:y1, x0:x1], profile), page_num)
+        words.shift(x0, y0)
+        reread = [r for r in extract_table_from_words(words) if r['nsn'] == row['nsn']] \
+            or extract_table_from_words(words)
+        
+        notes = row.setdefault('review_notes', [])
+        if not reread:
+            notes.append(f"Re-read at {dpi} DPI found no item - Check row against source")
             continue
         
-        nsn = nsn_matches[0]
+        best = max(reread, key=lambda r: sum(r[f'{name}_confidence'] for name in FIELD_LABELS))
+        changes = []
+        for name, label in FIELD_LABELS.items():
+            old_conf, new_conf = row[f'{name}_confidence'], best[f'{name}_confidence']
+            if new_conf > old_conf:
+                if best[name] != row[name]:
+                    changes.append(f"{label} '{row[name]}' -> '{best[name]}'")
+                row[name] = best[name]
+                row[f'{name}_confidence'] = new_conf
+        
+        if changes:
+            notes.append(f"Re-read at {dpi} DPI changed " + ", ".join(changes) + " - Verify")
+        else:
+            notes.append(f"Re-read at {dpi} DPI after low first-pass confidence")
+    
+    timings['ocr_recheck'] = time.perf_counter() - started
+    return len(weak)
+
+
+def ocr_page(pdf_path: str, page_num: int, dpi: int = 300, profile: str = 'auto',
+             adaptive: bool = False) -> Tuple[List[Dict], Dict]:
+    """
+    Rasterize and OCR a single page. Runs inside OCR pool workers, so it
+    only takes picklable arguments and never ships page images between
+    processes.
+    
+    With adaptive=True the page is read at OCR_FIRST_PASS_DPI and only
+    its low-confidence rows are re-read at `dpi` (see recheck_rows).
+    
+    Returns:
+        Tuple of (rows, stats) where stats holds the profile used, the
+        number of rows re-read and seconds per stage under 'timings'
+    """
+    print(f"\n--- Processing Page {page_num} ---")
+    timings = {}
+    first_dpi = min(OCR_FIRST_PASS_DPI, dpi) if adaptive else dpi
+    
+    started = time.perf_counter()
+    image = render_page(pdf_path, page_num, first_dpi)
+    timings['rasterize'] = time.perf_counter() - started
+    
+    try:
+        rows, profile_used = ocr_image(image, page_num, profile, timings)
+    finally:
+        image.close()
+    
+    rechecked = 0
+    if first_dpi < dpi:
+        rechecked = recheck_rows(pdf_path, page_num, rows, first_dpi, dpi,
+                                 PREPROCESS_PROFILES[profile_used], timings)
+        if rechecked:
+            print(f"  Re-read {rechecked} low-confidence row(s) at {dpi} DPI")
+    
+    print("  Timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    return rows, {'profile': profile_used, 'rechecked': rechecked, 'timings': timings}
+
+
+def configure_ocr_pool(max_workers: Optional[int] = None):
+    """Override OCR_MAX_WORKERS; an existing pool is replaced on the next get_ocr_pool()."""
+    global OCR_MAX_WORKERS, _ocr_pool
+    if max_workers is None:
+        return
+    with _ocr_pool_lock:
+        OCR_MAX_WORKERS = max_workers
+        pool, _ocr_pool = _ocr_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+def get_ocr_pool() -> ProcessPoolExecutor:
+    """
+    Return the process pool shared by all requests in this process.
+    
+    Created lazily so each gunicorn worker gets its own pool after fork.
+    Workers are spawned rather than forked to keep OpenCV/tesseract state
+    out of the children.
+    """
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(
+                max_workers=OCR_MAX_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+    return _ocr_pool
+
+
+def reset_ocr_pool(pool: ProcessPoolExecutor):
+    """
+    Discard a broken pool (a worker died, e.g. OOM-killed) so the next
+    get_ocr_pool builds a fresh one. A no-op if another request already
+    replaced it.
+    """
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is pool:
+            _ocr_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def ocr_pages(pdf_path: str, pages: Sequence[int], dpi: int = 300, workers: int = 1,
+              profile: Optional[str] = None,
+              adaptive: Optional[bool] = None) -> Iterator[Tuple[int, List[Dict], Dict]]:
+    """
+    OCR pages and yield their parsed rows in page order.
+    
+    With workers > 1 pages are OCR'd concurrently on the shared process
+    pool. At most `workers` pages of this request are in flight at once,
+    which caps both the request's share of the pool and its memory use.
+    
+    Pages are rasterized one at a time by ocr_page, so at most one page
+    image per in-flight page is alive at once. adaptive defaults to
+    OCR_ADAPTIVE_DPI (see ocr_page).
+    
+    Yields:
+        Tuples of (page_num, page_items, stats), in the order of `pages`
+    """
+    workers = max(1, min(workers, OCR_MAX_WORKERS))
+    if profile is None:
+        profile = OCR_PROFILE
+    if adaptive is None:
+        adaptive = OCR_ADAPTIVE_DPI
+    
+    if workers == 1 or len(pages) <= 1:
+        for page_num in pages:
+            yield (page_num, *ocr_page(pdf_path, page_num, dpi, profile, adaptive))
+        return
+    
+    pool = get_ocr_pool()
+    remaining = iter(pages)
+    in_flight = deque()
+    retried = False
+    
+    def submit(page_num):
+        try:
+            future = pool.submit(ocr_page, pdf_path, page_num, dpi, profile, adaptive)
+        except BrokenProcessPool as e:
+            # Broken by another request; handled like a failed result
+            future = Future()
+            future.set_exception(e)
+        in_flight.append((page_num, future))
+    
+    def submit_next():
+        page_num = next(remaining, None)
+        if page_num is not None:
+            submit(page_num)
+    
+    for _ in range(workers):
+        submit_next()
+    
+    try:
+        while in_flight:
+            page_num, future = in_flight[0]
+            try:
+                page_items, stats = future.result()
+            except BrokenProcessPool:
+                # Every page in flight on the pool is lost: replace the pool
+                # and resubmit them once, then fall back to OCR in-process
+                lost = [n for n, _ in in_flight]
+                in_flight.clear()
+                reset_ocr_pool(pool)
+                if retried:
+                    print(f"  OCR pool broke again; OCR'ing {len(lost)} page(s) and the rest serially")
+                    for n in lost + list(remaining):
+                        yield (n, *ocr_page(pdf_path, n, dpi, profile, adaptive))
+                    return
+                print(f"  OCR pool broke; retrying {len(lost)} page(s) on a new pool")
+                retried = True
+                pool = get_ocr_pool()
+                for n in lost:
+                    submit(n)
+                continue
+            in_flight.popleft()
+            submit_next()
+            yield page_num, page_items, stats
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+
+
+def build_extracted_items(page_items: List[Dict], first_line_no: int,
+                          source: str = 'OCR') -> List[ExtractedItem]:
+    """
+    Convert parsed rows to ExtractedItem objects with review flags.
+    
+    Line numbers continue from first_line_no so pages can be merged in order.
+    source is 'OCR' or 'TEXT' (PDF text layer) and only affects the
+    default review note.
+    
+    When an NSN catalog is configured (see dd1750_catalog), each NSN is
+    checked against it here rather than in the parsers, so cached rows
+    pick up catalog changes without re-extraction. An exact NIIN whose
+    nomenclature agrees with the description is fully confident and,
+    with CATALOG_AUTO_VERIFY, skips manual review if nothing else was
+    flagged and the quantity came from the text layer (the catalog cannot
+    confirm a quantity OCR read). A read one digit away from a single catalog NIIN is replaced
+    by it and flagged.
+    """
+    items = []
+    catalog = get_catalog()
+    
+    for item_data in page_items:
+        item = ExtractedItem(
+            line_no=first_line_no + len(items),
+            description=item_data['description'],
+            nsn=item_data['nsn'],
+            qty=item_data['qty'],
+            description_confidence=item_data['description_confidence'],
+            nsn_confidence=item_data['nsn_confidence'],
+            qty_confidence=item_data['qty_confidence'],
+            source_page=item_data.get('page', 0),
+        )
+        
+        # Notes recorded while extracting (e.g. high-resolution re-reads)
+        for note in item_data.get('review_notes', []):
+            item.add_review_note(note)
         
-        # Try to find description on this line or nearby lines
-        # Description is usually all caps or mixed case text
-        desc_match = re.search(r'([A-Z][A-Z\s,\-]{10,})', line)
-        description = ""
+        catalog_verified = False
+        if catalog is not None and item.nsn:
+            match = catalog.match(item.nsn, item.description)
+            if match is None:
+                item.add_review_note(f"NSN {item.nsn} not found in catalog - Verify accuracy")
+            elif match.exact:
+                item.nsn = match.niin
+                item.nsn_confidence = 100.0
+                if match.description_match:
+                    item.description_confidence = max(item.description_confidence, 95.0)
+                    catalog_verified = not item.review_notes
+                else:
+                    item.add_review_note(f"Catalog nomenclature for {match.niin}: {match.nomenclature} - Check description")
+            else:
+                item.add_review_note(f"NSN read as {item.nsn}; nearest catalog NIIN {match.niin} "
+                                     f"({match.nomenclature}) substituted - Verify")
+                item.nsn = match.niin
+                item.nsn_confidence = min(item.nsn_confidence, 75.0)
         
-        if desc_match:
-            description = desc_match.group(1).strip()
+        # Add review notes based on confidence
+        if item.nsn_confidence < 100:
+            item.add_review_note(f"NSN confidence: {item.nsn_confidence:.0f}% - Verify accuracy")
+        
+        if item.description_confidence < 80:
+            item.add_review_note(f"Description confidence: {item.description_confidence:.0f}% - Check for OCR errors")
+        
+        if item.qty_confidence < 90:
+            item.add_review_note(f"Quantity confidence: {item.qty_confidence:.0f}% - Verify count")
+        
+        # Always mark for review (accuracy is critical) unless the catalog
+        # confirmed the NSN and description, the quantity was read exactly
+        # from the text layer and nothing else was flagged
+        if catalog_verified and CATALOG_AUTO_VERIFY and source == 'TEXT' and not item.review_notes:
+            item.review_notes.append(f"Auto-verified against NSN catalog: {match.nomenclature}")
+            item.needs_review = False
         else:
-            # Look at next line for description
-            if i + 1 < len(lines):
-                next_line = lines[i + 1]
-                desc_match = re.search(r'([A-Z][A-Z\s,\-]{10,})', next_line)
-                if desc_match:
-                    description = desc_match.group(1).strip()
-        
-        if not description:
-            continue
+            item.needs_review = True
+        if item.needs_review and not item.review_notes:
+            if source == 'TEXT':
+                item.add_review_note("Extracted from PDF text layer - Confirm against source")
+            else:
+                item.add_review_note("Extracted via OCR - Manual verification required")
         
-        # Clean up description - remove leading "B " from LV column
-        description = re.sub(r'^B\s+', '', description)
-        description = re.sub(r'^A\s+', '', description)
+        items.append(item)
         
-        # Skip admin/header items (descriptions that are clearly not items)
-        skip_keywords = ['COMPONENT LISTING', 'HAND RECEIPT', 'BASIC ISSUE', 'END ITEM', 'BTY', 'ADA BATTE']
-        if any(keyword in description.upper() for keyword in skip_keywords):
+        print(f"    Item {item.line_no}: {item.description[:40]}... (NSN: {item.nsn}, Qty: {item.qty})")
+        print(f"      Confidence: {item.overall_confidence:.0f}% | Needs Review: {item.needs_review}")
+    
+    return items
+
+
+def normalize_description(description: str) -> str:
+    """Description as compared for consolidation: case, spacing and spaces around punctuation ignored."""
+    return DESCRIPTION_PUNCT_SPACING.sub(r'\1', ' '.join(description.upper().split()))
+
+
+def consolidate_items(items: List[ExtractedItem]) -> List[ExtractedItem]:
+    """
+    Merge items that repeat the same NSN and description, in one pass.
+    
+    A hash index on (NSN, normalized description) finds the first
+    occurrence of each part; later rows for it (continuation rows, or the
+    same component under several end items) are folded into it: quantities
+    summed, each confidence the lowest of the rows, review notes combined,
+    and source_pages listing every page read from. Merged items are always
+    flagged for review, since their quantity is no longer one row of the
+    BOM. Items without an NSN are never merged. Line numbers are
+    reassigned in order of first occurrence.
+    """
+    merged: List[ExtractedItem] = []
+    merged_rows: List[int] = []
+    index: Dict[Tuple[str, str], int] = {}
+    
+    for item in items:
+        pages = item.source_pages or [item.source_page]
+        key = (item.nsn, normalize_description(item.description))
+        position = index.get(key) if item.nsn else None
+        
+        if position is None:
+            if item.nsn:
+                index[key] = len(merged)
+            merged.append(replace(item, review_notes=list(item.review_notes), source_pages=list(pages)))
+            merged_rows.append(1)
             continue
         
-        # Look for quantity - usually at end of line or next line
-        # Look for "Auth Qty" column or just numbers
-        qty = 1  # Default
-        qty_confidence = 50.0  # Default if we can't find it
+        first = merged[position]
+        first.qty += item.qty
+        first.description_confidence = min(first.description_confidence, item.description_confidence)
+        first.nsn_confidence = min(first.nsn_confidence, item.nsn_confidence)
+        first.qty_confidence = min(first.qty_confidence, item.qty_confidence)
+        first.review_notes.extend(note for note in item.review_notes if note not in first.review_notes)
+        first.source_pages = sorted(set(first.source_pages) | set(pages))
+        merged_rows[position] += 1
+    
+    for line_no, (item, rows) in enumerate(zip(merged, merged_rows), 1):
+        item.line_no = line_no
+        if rows > 1:
+            pages = ', '.join(str(page) for page in item.source_pages)
+            item.add_review_note(f"Consolidated {rows} rows (pages {pages}) - Verify total quantity")
+    
+    if len(merged) < len(items):
+        print(f"  Consolidated {len(items)} items into {len(merged)}")
+    return merged
+
+
+def cluster_rows(words: PageWords) -> List[List[int]]:
+    """
+    Group words into table rows by their vertical centers.
+    
+    A word joins the current row when its center is within 60% of the
+    median word height of the row's running center. Words are visited
+    once after sorting, and each row (a list of word indices) comes back
+    ordered left to right.
+    """
+    if not len(words):
+        return []
+    
+    centers = words.top + words.height / 2
+    tolerance = max(float(np.median(words.height)), 1.0) * 0.6
+    
+    rows = []
+    current_row = []
+    row_center = None
+    
+    for i in np.argsort(centers, kind='stable'):
+        i = int(i)
+        center = float(centers[i])
+        if row_center is None or center - row_center > tolerance:
+            if current_row:
+                rows.append(sorted(current_row, key=lambda j: words.left[j]))
+            current_row = [i]
+            row_center = center
+        else:
+            current_row.append(i)
+            row_center += (center - row_center) / len(current_row)
+    
+    if current_row:
+        rows.append(sorted(current_row, key=lambda j: words.left[j]))
+    
+    return rows
+
+
+def find_column_layout(words: PageWords, rows: List[List[int]]) -> Tuple[Optional[int], Dict[str, Tuple[float, float]]]:
+    """
+    Locate the column header row and derive column x-ranges from it.
+    
+    A row counts as the header when it names the NIIN column and either
+    the description or quantity column. Each column runs from just left of
+    its header word to just left of the next column's header word.
+    
+    Returns:
+        Tuple of (header_row_index, {column: (x_start, x_end)}), or
+        (None, {}) if no header row was found
+    """
+    for row_idx, row in enumerate(rows):
+        starts = {}
+        for i in row:
+            column = HEADER_KEYWORDS.get(words.text[i].upper().strip(':.'))
+            if column and column not in starts:
+                starts[column] = float(words.left[i])
         
-        # Search this line and next 2 lines for quantity
-        search_text = line
-        if i + 1 < len(lines):
-            search_text += " " + lines[i + 1]
-        if i + 2 < len(lines):
-            search_text += " " + lines[i + 2]
-        
-        # Look for Auth Qty pattern
-        qty_match = re.search(r'Auth\s+Qty\s*[:\-]?\s*(\d+)', search_text, re.IGNORECASE)
-        if not qty_match:
-            # Look for any standalone number (1-100 range)
-            all_nums = re.findall(r'\b(\d{1,3})\b', search_text)
-            if all_nums:
-                # Take last number (usually quantity is at end)
-                for num in reversed(all_nums):
-                    if num != nsn and 1 <= int(num) <= 100:
-                        qty_match = (int(num),)
-                        break
-        
-        if qty_match:
-            qty = int(qty_match[0]) if isinstance(qty_match, tuple) else int(qty_match.group(1))
-            _, _, qty_confidence = validate_quantity(str(qty))
-        
-        # Calculate confidence scores
-        nsn_valid, nsn_conf = validate_nsn(nsn)
-        
-        # Description confidence based on OCR word confidences
-        desc_words = description.split()
-        desc_confidences = [confidence_map.get(word, 50) for word in desc_words]
-        desc_conf = sum(desc_confidences) / len(desc_confidences) if desc_confidences else 50.0
-        
-        items.append({
-            'nsn': nsn,
-            'description': description,
-            'qty': qty,
-            'nsn_confidence': nsn_conf,
-            'description_confidence': desc_conf,
-            'qty_confidence': qty_confidence,
-        })
+        if 'nsn' not in starts or not ('description' in starts or 'qty' in starts):
+            continue
+        
+        margin = float(words.height[row].max())
+        ordered = sorted(starts.items(), key=lambda kv: kv[1])
+        layout = {}
+        for k, (column, start) in enumerate(ordered):
+            end = ordered[k + 1][1] - margin if k + 1 < len(ordered) else float('inf')
+            layout[column] = (start - margin, end)
+        return row_idx, layout
     
-    return items
+    return None, {}
 
 
-def extract_items_with_ocr(pdf_path: str, start_page: int = 0) -> List[ExtractedItem]:
+def _column_of(words: PageWords, i: int, layout: Dict[str, Tuple[float, float]]) -> Optional[str]:
+    center = words.left[i] + words.width[i] / 2
+    for column, (start, end) in layout.items():
+        if start <= center < end:
+            return column
+    return None
+
+
+def _description_words(words: PageWords, indices: List[int]) -> List[int]:
     """
-    Main OCR extraction function.
+    The description among a row's words: from the first word that is not a
+    number or unit of issue, up to the unit of issue, minus trailing
+    numbers and a single-letter LV code (A/B).
+    
+    Numbers inside the description ("CABLE ASSY 10 FT") are kept. A unit
+    code directly after a number is a measurement unit unless only the
+    quantity columns follow it.
+    """
+    texts = [words.text[i] for i in indices]
+    start = next((k for k, text in enumerate(texts)
+                  if not text.isdigit() and text not in UNIT_OF_ISSUE_CODES), len(texts))
+    
+    end = len(texts)
+    for k in range(start + 1, len(texts)):
+        if texts[k] not in UNIT_OF_ISSUE_CODES:
+            continue
+        after = texts[k + 1:]
+        if (after and all(text.isdigit() for text in after)) or not texts[k - 1].isdigit():
+            end = k
+            break
     
-    Extracts items from image-based PDF and returns with confidence scores.
-    ALL items are marked for review by default.
+    run = list(indices[start:end])
+    while run and words.text[run[-1]].isdigit():
+        run.pop()
+    if len(run) > 1 and words.text[run[0]] in ('A', 'B'):
+        run = run[1:]
+    return run
+
+
+def extract_table_from_words(words: PageWords) -> List[Dict]:
     """
-    print(f"\n{'='*80}")
-    print("OCR EXTRACTION - ACCURACY FIRST MODE")
-    print(f"{'='*80}")
+    Layout-aware BOM parser over OCR word boxes.
+    
+    One pass over rows clustered by geometry (see cluster_rows). When a
+    column header is found, NIIN/description/quantity are read from their
+    columns; otherwise description is the text run right of the NIIN and
+    quantity the last small number on the same row. Quantities never come
+    from a neighbouring row. A NIIN row with no description takes it from
+    the row directly below, as continuation lines do on scanned listings.
+    
+    Each field's confidence combines its format check with the OCR
+    confidence of the exact words it was read from.
+    
+    Returns:
+        Item rows in the same shape as extract_table_from_text
+    """
+    rows = cluster_rows(words)
+    header_idx, layout = find_column_layout(words, rows)
     
     items = []
+    pending = None  # NIIN row still waiting for its description
     
-    try:
-        # Convert PDF to images
-        print(f"\nConverting PDF to images...")
-        images = convert_from_path(pdf_path, dpi=300)  # High DPI for better accuracy
-        print(f"  Converted {len(images)} pages")
-        
-        # Process each page
-        for page_num, image in enumerate(images[start_page:], start=start_page + 1):
-            print(f"\n--- Processing Page {page_num} ---")
-            
-            # Preprocess image
-            print("  Preprocessing image for OCR...")
-            processed = preprocess_image(image)
-            
-            # Extract text with confidence
-            print("  Running OCR...")
-            text, confidence_map = extract_text_with_confidence(processed)
-            
-            print(f"  Extracted {len(text)} characters")
-            
-            # Parse table structure
-            print("  Parsing table structure...")
-            page_items = extract_table_from_text(text, confidence_map)
-            
-            print(f"  Found {len(page_items)} potential items")
-            
-            # Convert to ExtractedItem objects with review flags
-            for item_data in page_items:
-                item = ExtractedItem(
-                    line_no=len(items) + 1,
-                    description=item_data['description'],
-                    nsn=item_data['nsn'],
-                    qty=item_data['qty'],
-                    description_confidence=item_data['description_confidence'],
-                    nsn_confidence=item_data['nsn_confidence'],
-                    qty_confidence=item_data['qty_confidence'],
-                )
-                
-                # Add review notes based on confidence
-                if item.nsn_confidence < 100:
-                    item.add_review_note(f"NSN confidence: {item.nsn_confidence:.0f}% - Verify accuracy")
-                
-                if item.description_confidence < 80:
-                    item.add_review_note(f"Description confidence: {item.description_confidence:.0f}% - Check for OCR errors")
-                
-                if item.qty_confidence < 90:
-                    item.add_review_note(f"Quantity confidence: {item.qty_confidence:.0f}% - Verify count")
-                
-                # Always mark for review (accuracy is critical)
-                item.needs_review = True
-                if not item.review_notes:
-                    item.add_review_note("Extracted via OCR - Manual verification required")
-                
-                items.append(item)
-                
-                print(f"    Item {item.line_no}: {item.description[:40]}... (NSN: {item.nsn}, Qty: {item.qty})")
-                print(f"      Confidence: {item.overall_confidence:.0f}% | Needs Review: {item.needs_review}")
-    
-    except Exception as e:
-        print(f"\nERROR during OCR extraction: {e}")
-        import traceback
-        traceback.print_exc()
-    
-    print(f"\n{'='*80}")
-    print(f"EXTRACTION COMPLETE: {len(items)} items extracted")
-    print(f"All items flagged for mandatory review")
-    print(f"{'='*80}\n")
+    for row_idx, row in enumerate(rows):
+        if header_idx is not None and row_idx <= header_idx:
+            continue
+        
+        niin_pos = next((k for k, i in enumerate(row) if normalize_niin(words.text[i]) is not None), None)
+        
+        if niin_pos is None:
+            if pending is not None:
+                if layout and 'description' in layout:
+                    candidates = [i for i in row if _column_of(words, i, layout) == 'description']
+                else:
+                    candidates = row
+                pending['desc_words'] = _description_words(words, candidates)
+                items.append(pending)
+                pending = None
+            continue
+        
+        pending = None
+        rest = row[niin_pos + 1:]
+        
+        if layout:
+            # Header words rarely sit exactly over their columns, so long
+            # descriptions may spill past the next header; only unit-of-issue
+            # words and numbers under the quantity header are excluded
+            columns = [_column_of(words, i, layout) for i in rest]
+            desc_candidates = [i for i, col in zip(rest, columns)
+                               if col != 'ui' and not (col == 'qty' and words.text[i].isdigit())]
+            qty_candidates = [i for i, col in zip(rest, columns) if col == 'qty']
+        else:
+            desc_candidates = rest
+            qty_candidates = rest
+        
+        desc_words = _description_words(words, desc_candidates)
+        qty_words = [i for i in qty_candidates
+                     if QTY_TOKEN.match(words.text[i])
+                     and (not desc_words or words.left[i] > words.left[desc_words[-1]])]
+        
+        entry = {
+            'niin_word': row[niin_pos],
+            'desc_words': desc_words,
+            'qty_word': qty_words[-1] if qty_words else None,
+        }
+        
+        if desc_words:
+            items.append(entry)
+        else:
+            pending = entry
     
-    return items
+    results = []
+    for entry in items:
+        description = ' '.join(words.text[i] for i in entry['desc_words']).strip()
+        if sum(c.isalpha() for c in description) < 3:
+            continue
+        if SKIP_PATTERN.search(description.upper()):
+            continue
+        
+        niin_word = entry['niin_word']
+        nsn_read = words.text[niin_word]
+        nsn = normalize_niin(nsn_read)
+        _, nsn_conf = validate_nsn(nsn)
+        nsn_conf = min(nsn_conf, float(words.conf[niin_word]))
+        
+        review_notes = []
+        if nsn != nsn_read:
+            nsn_conf = min(nsn_conf, 70.0)
+            review_notes.append(f"NSN read as '{nsn_read}' - OCR letter/digit confusions corrected")
+        
+        qty = 1  # Default
+        qty_confidence = 50.0  # Default if we can't find it
+        if entry['qty_word'] is not None:
+            qty_word = entry['qty_word']
+            _, qty, qty_confidence = validate_quantity(words.text[qty_word])
+            qty_confidence = min(qty_confidence, float(words.conf[qty_word]))
+        
+        used = [niin_word] + entry['desc_words']
+        if entry['qty_word'] is not None:
+            used.append(entry['qty_word'])
+        
+        results.append({
+            'nsn': nsn,
+            'description': description,
+            'qty': qty,
+            'nsn_confidence': nsn_conf,
+            'description_confidence': words.mean_conf(entry['desc_words']),
+            'qty_confidence': qty_confidence,
+            'page': words.page,
+            'review_notes': review_notes,
+            # Row bounds in page pixels, used to re-read just this row
+            'box': [
+                float(words.left[used].min()),
+                float(words.top[used].min()),
+                float((words.left[used] + words.width[used]).max()),
+                float((words.top[used] + words.height[used]).max()),
+            ],
+        })
+    
+    return results
 
 
 def generate_review_report(items: List[ExtractedItem]) -> str:
@@ -372,6 +1517,8 @@ def generate_review_report(items: List[ExtractedItem]) -> str:
         report.append(f"  NSN: {item.nsn} (Confidence: {item.nsn_confidence:.0f}%)")
         report.append(f"  Quantity: {item.qty} (Confidence: {item.qty_confidence:.0f}%)")
         report.append(f"  Overall Confidence: {item.overall_confidence:.0f}%")
+        if len(item.source_pages) > 1:
+            report.append(f"  Source Pages: {', '.join(str(page) for page in item.source_pages)}")
         
         if item.needs_review:
             report.append(f"  ⚠️  NEEDS REVIEW:")
@@ -395,18 +1542,7 @@ def generate_review_report(items: List[ExtractedItem]) -> str:
 
 # Test function
 if __name__ == "__main__":
-    # Test with handwritten BOM
-    print("Testing OCR extraction...")
-    
-    test_pdf = "/mnt/user-data/uploads/handwritten_boms.pdf"
-    items = extract_items_with_ocr(test_pdf)
-    
-    print("\n\n")
-    report = generate_review_report(items)
-    print(report)
-    
-    # Save report
-    with open("/home/claude/ocr_review_report.txt", "w") as f:
-        f.write(report)
-    
-    print("\n✅ Report saved to: /home/claude/ocr_review_report.txt")
+    # Bulk extraction from the command line lives in dd1750_cli
+    import sys
+    from dd1750_cli import main
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+Server-side Session Store for DD1750 Generator
+Keeps templates and item lists off the cookie; the cookie only carries an ID
+"""
+
+import os
+import re
+import json
+import time
+import fcntl
+import shutil
+import sqlite3
+import secrets
+import tempfile
+import threading
+from typing import Optional, Any, Callable
+
+
+STORE_BACKEND = os.environ.get('DD1750_STORE', 'file')  # 'file' or 'sqlite'
+STORE_PATH = os.environ.get('DD1750_STORE_PATH', os.path.join(tempfile.gettempdir(), 'dd1750-sessions'))
+STORE_TTL = int(os.environ.get('DD1750_STORE_TTL', 4 * 3600))  # seconds
+
+# How often (seconds) a process sweeps expired sessions
+PURGE_INTERVAL = 300
+
+_ID_RE = re.compile(r'^[A-Za-z0-9_\-]{16,64}$')
+
+
+class SessionStore:
+    """
+    Named blobs per session ID, expiring STORE_TTL seconds after last use.
+
+    Subclasses implement the byte-level operations; JSON values are
+    stored as UTF-8 blobs on top of them.
+    """
+
+    def __init__(self, ttl: int = STORE_TTL):
+        self.ttl = ttl
+        self._last_purge = 0.0
+
+    @staticmethod
+    def new_id() -> str:
+        return secrets.token_urlsafe(24)
+
+    @staticmethod
+    def valid_id(sid: Optional[str]) -> bool:
+        return bool(sid) and bool(_ID_RE.match(sid))
+
+    def get_blob(self, sid: str, name: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def put_blob(self, sid: str, name: str, data: bytes):
+        raise NotImplementedError
+
+    def delete(self, sid: str):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        raise NotImplementedError
+
+    def get_json(self, sid: str, name: str) -> Optional[Any]:
+        data = self.get_blob(sid, name)
+        return json.loads(data) if data is not None else None
+
+    def put_json(self, sid: str, name: str, value: Any):
+        self.put_blob(sid, name, json.dumps(value).encode('utf-8'))
+
+    def update_json(self, sid: str, name: str, fn: Callable[[Optional[Any]], Any]) -> Any:
+        """
+        Atomically replace a JSON value with fn(current value or None).
+
+        No other update_json on the same session runs in between, in any
+        process. If fn raises, nothing is written. Returns the new value.
+        """
+        raise NotImplementedError
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = now
+            try:
+                self.purge_expired()
+            except Exception as e:
+                print(f"Error purging expired sessions: {e}")
+
+
+class FileSessionStore(SessionStore):
+    """One directory per session, one file per value. Directory mtime is last use."""
+
+    def __init__(self, root: str, ttl: int = STORE_TTL):
+        super().__init__(ttl)
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, sid: str) -> str:
+        if not self.valid_id(sid):
+            raise ValueError(f"Invalid session id: {sid!r}")
+        return os.path.join(self.root, sid)
+
+    def _expired(self, path: str) -> bool:
+        return time.time() - os.stat(path).st_mtime > self.ttl
+
+    def get_blob(self, sid: str, name: str) -> Optional[bytes]:
+        session_dir = self._dir(sid)
+        try:
+            if self._expired(session_dir):
+                self.delete(sid)
+                return None
+            with open(os.path.join(session_dir, name), 'rb') as f:
+                data = f.read()
+            os.utime(session_dir)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put_blob(self, sid: str, name: str, data: bytes):
+        session_dir = self._dir(sid)
+        os.makedirs(session_dir, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=session_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(session_dir, name))
+        os.utime(session_dir)
+
+        self._maybe_purge()
+
+    def update_json(self, sid: str, name: str, fn: Callable[[Optional[Any]], Any]) -> Any:
+        session_dir = self._dir(sid)
+        os.makedirs(session_dir, exist_ok=True)
+        with open(os.path.join(session_dir, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            value = fn(self.get_json(sid, name))
+            self.put_json(sid, name, value)
+        return value
+
+    def delete(self, sid: str):
+        shutil.rmtree(self._dir(sid), ignore_errors=True)
+
+    def purge_expired(self):
+        for sid in os.listdir(self.root):
+            path = os.path.join(self.root, sid)
+            try:
+                if self.valid_id(sid) and self._expired(path):
+                    shutil.rmtree(path, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+
+class SQLiteSessionStore(SessionStore):
+    """Single SQLite file in WAL mode, shared by all workers on the host."""
+
+    def __init__(self, db_path: str, ttl: int = STORE_TTL):
+        super().__init__(ttl)
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_values ("
+                " sid TEXT NOT NULL, name TEXT NOT NULL, data BLOB NOT NULL,"
+                " updated REAL NOT NULL, PRIMARY KEY (sid, name))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_session_updated ON session_values (updated)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_blob(self, sid: str, name: str) -> Optional[bytes]:
+        if not self.valid_id(sid):
+            return None
+        now = time.time()
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT data FROM session_values WHERE sid = ? AND name = ? AND updated > ?",
+                (sid, name, now - self.ttl),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE session_values SET updated = ? WHERE sid = ?", (now, sid))
+        return bytes(row[0]) if row is not None else None
+
+    def put_blob(self, sid: str, name: str, data: bytes):
+        if not self.valid_id(sid):
+            raise ValueError(f"Invalid session id: {sid!r}")
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO session_values (sid, name, data, updated) VALUES (?, ?, ?, ?)",
+                (sid, name, sqlite3.Binary(data), now),
+            )
+            conn.execute("UPDATE session_values SET updated = ? WHERE sid = ?", (now, sid))
+        self._maybe_purge()
+
+    def update_json(self, sid: str, name: str, fn: Callable[[Optional[Any]], Any]) -> Any:
+        if not self.valid_id(sid):
+            raise ValueError(f"Invalid session id: {sid!r}")
+        conn = self._conn()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front, so the read below cannot go stale
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM session_values WHERE sid = ? AND name = ? AND updated > ?",
+                (sid, name, now - self.ttl),
+            ).fetchone()
+            value = fn(json.loads(bytes(row[0])) if row is not None else None)
+            conn.execute(
+                "INSERT OR REPLACE INTO session_values (sid, name, data, updated) VALUES (?, ?, ?, ?)",
+                (sid, name, sqlite3.Binary(json.dumps(value).encode('utf-8')), now),
+            )
+            conn.execute("UPDATE session_values SET updated = ? WHERE sid = ?", (now, sid))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return value
+
+    def delete(self, sid: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM session_values WHERE sid = ?", (sid,))
+
+    def purge_expired(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM session_values WHERE updated <= ?", (time.time() - self.ttl,))
+
+
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Return the process-wide store selected by DD1750_STORE."""
+    global _session_store
+    if _session_store is None:
+        if STORE_BACKEND == 'sqlite':
+            db_path = STORE_PATH if STORE_PATH.endswith('.db') else os.path.join(STORE_PATH, 'sessions.db')
+            _session_store = SQLiteSessionStore(db_path)
+        else:
+            _session_store = FileSessionStore(STORE_PATH)
+    return _session_store
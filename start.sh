@@ -7,4 +7,6 @@ export PORT=${PORT:-8000}
 echo "Starting app on port $PORT"
 
 # Start gunicorn
-exec gunicorn --bind 0.0.0.0:$PORT --workers 2 --timeout 120 app:app
+# Threaded workers keep /health, /generate and job status polls responsive
+# while extraction jobs run in the background.
+exec gunicorn --bind 0.0.0.0:$PORT --workers 2 --worker-class gthread --threads 4 --timeout 120 app:app